@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import logging
+import os
+import queue
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from scenario_report import (DEFAULT_REGRESSION_THRESHOLD, ScenarioResult, compare_reports,
+                             create_report, load_report, log_comparison, parse_scenario_output,
+                             read_criteria, write_junit)
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_SIMULATOR_IMAGE = "rwthika/carla-simulator:server"
+DEFAULT_SCENARIO_RUNNER_IMAGE = "rwthika/carla-scenario-runner:latest"
+COMPOSE_PROJECT_PREFIX = "carlos-evaluation"
+SIMULATOR_SERVICE = "carla-server"
+SCENARIO_RUNNER_SERVICE = "carla-scenario-runner"
+
+RESTART_POLICIES = ("always", "health", "never")
+# Seconds until an unhealthy simulator start is aborted and how often it is attempted
+SIMULATOR_START_TIMEOUT = 300
+SIMULATOR_START_ATTEMPTS = 3
+PROBE_SCRIPT = Path(__file__).resolve().parent / "probe_simulator.py"
+# Mount point of the per scenario result folder in the scenario runner container
+SCENARIO_RUNNER_OUTPUT_DIR = "/results/"
+SCENARIO_RUNNER_FLAGS = f"--json --outputDir {SCENARIO_RUNNER_OUTPUT_DIR}"
+REPORT_FILE = "report.json"
+JUNIT_FILE = "report.xml"
+
+MEMORY_UNITS = {"B": 1, "KiB": 1024, "MiB": 1024**2, "GiB": 1024**3, "TiB": 1024**4,
+                "kB": 1000, "MB": 1000**2, "GB": 1000**3, "TB": 1000**4}
+
+
+def parse_memory(memory: str) -> float:
+    # e.g. "1.5GiB" as reported by docker stats
+    match = re.match(r"([\d.]+)\s*([A-Za-z]+)", memory.strip())
+    return float(match.group(1)) * MEMORY_UNITS.get(match.group(2), 1) if match else 0.0
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Evaluate all scenarios of a folder on a pool of simulator instances",
+        epilog="Environment variables for customization: SIMULATOR_IMAGE, "
+               "SCENARIO_RUNNER_IMAGE, TIME_BETWEEN_EVALS")
+    parser.add_argument('compose_template', nargs='?', default='./template.yml',
+                        help='Compose file which can be customized through environment variables')
+    parser.add_argument('scenario_folder', nargs='?', default='../utils/scenarios',
+                        help='Folder containing scenario files ending with .xosc*')
+    parser.add_argument('-o', '--offscreen', action='store_true',
+                        help='Set the simulators to offscreen mode')
+    parser.add_argument('-p', '--pull', action='store_true',
+                        help='Pull/Update images before starting the simulation')
+    parser.add_argument('--restart-policy', choices=RESTART_POLICIES, default='health',
+                        help='Restart the simulator after every scenario (always), only if a health '
+                             'probe fails (health) or only if it is not healthy anymore (never) '
+                             '(default: health)')
+    parser.add_argument('-n', '--no-restart', action='store_const', dest='restart_policy',
+                        const='never', help='Only restart the simulator if it is not healthy anymore')
+    parser.add_argument('--restart-every', type=int, default=0,
+                        help='Restart the simulator after N scenarios, 0 disables (default: 0)')
+    parser.add_argument('--max-memory-growth', type=float, default=2048,
+                        help='Restart the simulator once its memory grew by this many MiB (default: 2048)')
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help='Number of simulator instances evaluating scenarios in parallel (default: 1)')
+    parser.add_argument('--output-dir', default='./results',
+                        help='Folder for the scenario runner logs and reports (default: ./results)')
+    parser.add_argument('--compare', metavar='PREVIOUS',
+                        help='Json report of a previous evaluation to compare pass rate and performance with')
+    parser.add_argument('--regression-threshold', type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help='Relative drop of the real-time factor which is reported as regression '
+                             f'(default: {DEFAULT_REGRESSION_THRESHOLD})')
+    return parser.parse_args()
+
+
+class EvaluationWorker:
+    """Evaluates scenarios on its own simulator in an isolated compose project."""
+
+    def __init__(self, index: int, compose_template: Path, env: dict[str, str],
+                 args: argparse.Namespace, time_between_evals: float, output_dir: Path):
+        self.index = index
+        self.project_name = f"{COMPOSE_PROJECT_PREFIX}-{index}"
+        self.compose_template = compose_template
+        self.env = env
+        self.restart_policy = args.restart_policy
+        self.restart_every = args.restart_every
+        self.max_memory_growth = args.max_memory_growth * 1024**2
+        self.time_between_evals = time_between_evals
+        self.output_dir = output_dir
+        self.scenarios_since_start = 0
+        self.baseline_memory = 0.0
+        self.restarts = 0
+
+    def compose(self, *args: str, env: dict[str, str] = None, **kwargs) -> subprocess.CompletedProcess:
+        return subprocess.run(
+            ["docker", "compose", "-p", self.project_name, "-f", str(self.compose_template), *args],
+            env=env or self.env, **kwargs)
+
+    def start_simulator(self) -> bool:
+        # Waits until the healthcheck of the simulator passes instead of a fixed delay
+        for attempt in range(1, SIMULATOR_START_ATTEMPTS + 1):
+            start_time = time.monotonic()
+            process = self.compose("up", "-d", "--wait", "--wait-timeout", str(SIMULATOR_START_TIMEOUT),
+                                   SIMULATOR_SERVICE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                   text=True)
+            if process.returncode == 0:
+                logging.info(f"[worker {self.index}] Simulator ready after "
+                             f"{time.monotonic() - start_time:.0f}s")
+                self.scenarios_since_start = 0
+                self.baseline_memory = self.get_memory()
+                return True
+            logging.error(f"[worker {self.index}] Simulator did not become healthy "
+                          f"(attempt {attempt}/{SIMULATOR_START_ATTEMPTS}): {process.stderr.strip()}")
+            self.stop_simulator()
+        return False
+
+    def get_container_id(self) -> str:
+        process = self.compose("ps", "-q", SIMULATOR_SERVICE, capture_output=True, text=True)
+        return process.stdout.strip()
+
+    def is_healthy(self) -> bool:
+        container_id = self.get_container_id()
+        if not container_id:
+            return False
+        process = subprocess.run(
+            ["docker", "inspect", "--format",
+             "{{.State.Running}} {{if .State.Health}}{{.State.Health.Status}}{{end}}",
+             container_id], capture_output=True, text=True)
+        state = process.stdout.split()
+        return bool(state) and state[0] == "true" and state[1:] in ([], ["healthy"])
+
+    def get_memory(self) -> float:
+        container_id = self.get_container_id()
+        if not container_id:
+            return 0.0
+        process = subprocess.run(
+            ["docker", "stats", "--no-stream", "--format", "{{.MemUsage}}", container_id],
+            capture_output=True, text=True)
+        return parse_memory(process.stdout.split("/")[0]) if process.returncode == 0 else 0.0
+
+    def probe_actors(self) -> Optional[dict[str, int]]:
+        # The probe runs in the scenario runner image, which provides the CARLA Python API
+        process = self.compose(
+            "run", "--rm", "--no-deps", "-v", f"{PROBE_SCRIPT}:/probe_simulator.py",
+            SCENARIO_RUNNER_SERVICE, "bash", "-ic",
+            f"python /probe_simulator.py --host {SIMULATOR_SERVICE}",
+            capture_output=True, text=True)
+        lines = process.stdout.strip().splitlines()
+        if process.returncode != 0 or not lines:
+            return None
+        try:
+            return json.loads(lines[-1])["actors"]
+        except (json.JSONDecodeError, KeyError):
+            return None
+
+    def get_restart_reason(self, result: ScenarioResult) -> Optional[str]:
+        if self.restart_policy == "always":
+            return "restart after every scenario"
+        if not self.is_healthy():
+            return "simulator not healthy"
+        if self.restart_policy == "never":
+            return None
+        if result.status == "error":
+            return "scenario runner error"
+        if self.restart_every > 0 and self.scenarios_since_start >= self.restart_every:
+            return f"{self.scenarios_since_start} scenarios since last restart"
+        memory_growth = self.get_memory() - self.baseline_memory
+        if memory_growth > self.max_memory_growth:
+            return f"memory grew by {memory_growth / 1024**2:.0f}MiB"
+        actors = self.probe_actors()
+        if actors is None:
+            return "simulator not responding"
+        leaked_actors = {kind: count for kind, count in actors.items() if count > 0}
+        if leaked_actors:
+            return "leaked actors " + ", ".join(
+                f"{count} {kind}" for kind, count in leaked_actors.items())
+        return None
+
+    def stop_simulator(self) -> None:
+        self.compose("kill", stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.compose("down", stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def evaluate(self, scenario: str) -> ScenarioResult:
+        logging.info(f"[worker {self.index}] Evaluating {scenario} ...")
+        start_time = time.monotonic()
+        log_file = self.output_dir / f"{scenario}.log"
+        result_dir = self.output_dir / scenario
+        shutil.rmtree(result_dir, ignore_errors=True)
+        result_dir.mkdir(exist_ok=True)
+        with log_file.open("w") as log:
+            process = self.compose("run", "--rm", "-v", f"{result_dir}:{SCENARIO_RUNNER_OUTPUT_DIR}",
+                                   SCENARIO_RUNNER_SERVICE,
+                                   env={**self.env, "SCENARIO_FILE_NAME": scenario,
+                                        "SCENARIO_RUNNER_FLAGS": SCENARIO_RUNNER_FLAGS},
+                                   stdout=log, stderr=subprocess.STDOUT)
+        duration = time.monotonic() - start_time
+
+        output = parse_scenario_output(log_file.read_text(errors="replace"))
+        success, criteria = read_criteria(result_dir)
+        if success is None:
+            success = output["success"]
+        if success is not None:
+            status = "passed" if success else "failed"
+        else:
+            status = "passed" if process.returncode == 0 else "error"
+        return ScenarioResult(scenario, self.index, status, duration, log_file, criteria,
+                              output["system_time"], output["game_time"])
+
+    def run(self, scenarios: queue.Queue, results: list[ScenarioResult], lock: threading.Lock) -> None:
+        # Scenarios are taken from a shared queue, so fast workers take over more scenarios
+        if not self.start_simulator():
+            logging.error(f"[worker {self.index}] Stopping worker, simulator could not be started")
+            return
+        while True:
+            try:
+                scenario = scenarios.get_nowait()
+            except queue.Empty:
+                break
+            result = self.evaluate(scenario)
+            real_time_factor = (f", {result.real_time_factor:.2f}x real time"
+                                if result.real_time_factor is not None else "")
+            logging.info(f"[worker {self.index}] {scenario}: {result.status} "
+                         f"after {result.duration:.0f}s{real_time_factor}")
+            with lock:
+                results.append(result)
+            self.scenarios_since_start += 1
+            if scenarios.empty():
+                continue
+            restart_reason = self.get_restart_reason(result)
+            if restart_reason:
+                logging.info(f"[worker {self.index}] Restarting simulator ({restart_reason})...")
+                self.restarts += 1
+                self.stop_simulator()
+                if not self.start_simulator():
+                    logging.error(f"[worker {self.index}] Stopping worker, "
+                                  f"simulator could not be restarted")
+                    return
+            if self.time_between_evals > 0:
+                time.sleep(self.time_between_evals)
+        self.stop_simulator()
+
+
+def get_image_id(image: str) -> Optional[str]:
+    process = subprocess.run(["docker", "image", "inspect", "--format", "{{.Id}}", image],
+                             capture_output=True, text=True)
+    return process.stdout.strip() if process.returncode == 0 else None
+
+
+def log_summary(results: list[ScenarioResult], summary: dict) -> bool:
+    results = sorted(results, key=lambda result: result.scenario)
+    failed_results = [result for result in results if result.status != "passed"]
+    logging.info(f"{summary['passed']} of {summary['scenarios']} scenarios passed "
+                 f"in {summary['wall_time']:.0f}s ({summary['evaluation_time']:.0f}s "
+                 f"accumulated evaluation time)")
+    if summary["real_time_factor"]:
+        logging.info(f"Real-time factor: {summary['real_time_factor']['mean']:.2f} mean, "
+                     f"{summary['real_time_factor']['min']:.2f} min")
+    for result in failed_results:
+        failed_criteria = (f" ({', '.join(result.failed_criteria)})"
+                           if result.failed_criteria else "")
+        logging.warning(f"{'Optional scenario' if result.optional else 'Scenario'} "
+                        f"{result.scenario} {result.status}{failed_criteria}, see {result.log_file}")
+    return summary["required_passed"]
+
+
+def main():
+    args = parse_arguments()
+    compose_template = Path(args.compose_template).resolve()
+    scenario_folder = Path(args.scenario_folder).resolve()
+    output_dir = Path(args.output_dir).resolve()
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    if not compose_template.is_file():
+        logging.error(f"Compose template not found: {compose_template}")
+        return 1
+
+    logging.info(f"Searching for scenarios in {scenario_folder} ...")
+    scenarios = sorted(path.name for path in scenario_folder.glob("*.xosc*") if path.is_file())
+    if not scenarios:
+        logging.error("No scenarios found. Exiting...")
+        return 1
+
+    env = {
+        **os.environ,
+        "SIMULATOR_IMAGE": os.environ.get("SIMULATOR_IMAGE", DEFAULT_SIMULATOR_IMAGE),
+        "SCENARIO_RUNNER_IMAGE": os.environ.get("SCENARIO_RUNNER_IMAGE", DEFAULT_SCENARIO_RUNNER_IMAGE),
+        "SCENARIO_FOLDER_PATH": str(scenario_folder),
+        "SIMULATOR_FLAGS": "-RenderOffScreen" if args.offscreen else "",
+        "SCENARIO_FILE_NAME": "",
+    }
+    time_between_evals = float(os.environ.get("TIME_BETWEEN_EVALS", 0))
+    num_workers = max(1, min(args.workers, len(scenarios)))
+    workers = [EvaluationWorker(index, compose_template, env, args,
+                                time_between_evals, output_dir)
+               for index in range(num_workers)]
+
+    if args.pull:
+        logging.info("Updating images...")
+        workers[0].compose("pull")
+
+    use_display = not args.offscreen and shutil.which("xhost")
+    if use_display:
+        subprocess.run(["xhost", "+local:"], stdout=subprocess.DEVNULL)
+
+    scenario_queue = queue.Queue()
+    for scenario in scenarios:
+        scenario_queue.put(scenario)
+    results = []
+    lock = threading.Lock()
+    logging.info(f"Evaluating {len(scenarios)} scenarios on {num_workers} simulators ...")
+    start_time = time.monotonic()
+    executor = ThreadPoolExecutor(max_workers=num_workers)
+    try:
+        futures = [executor.submit(worker.run, scenario_queue, results, lock)
+                   for worker in workers]
+        for future in futures:
+            future.result()
+    except KeyboardInterrupt:
+        logging.info("Cleaning up...")
+        # Workers stop after their current scenario, which is interrupted as well
+        while True:
+            try:
+                scenario_queue.get_nowait()
+            except queue.Empty:
+                break
+        for worker in workers:
+            worker.stop_simulator()
+        return 1
+    finally:
+        executor.shutdown(wait=True)
+        if use_display:
+            subprocess.run(["xhost", "-local:"], stdout=subprocess.DEVNULL)
+
+    # Scenarios left over if all workers stopped because their simulator could not be started
+    while True:
+        try:
+            scenario = scenario_queue.get_nowait()
+        except queue.Empty:
+            break
+        results.append(ScenarioResult(scenario, -1, "error", 0.0, output_dir / f"{scenario}.log"))
+    restarts = sum(worker.restarts for worker in workers)
+    logging.info(f"Simulators restarted {restarts} times")
+    report = create_report(results, time.monotonic() - start_time, {
+        "simulator_image": env["SIMULATOR_IMAGE"],
+        "scenario_runner_image": env["SCENARIO_RUNNER_IMAGE"],
+        "image_ids": {image: get_image_id(image)
+                      for image in (env["SIMULATOR_IMAGE"], env["SCENARIO_RUNNER_IMAGE"])},
+        "workers": num_workers,
+        "restarts": restarts,
+    })
+    if args.compare:
+        try:
+            report["comparison"] = compare_reports(report, load_report(args.compare),
+                                                   args.regression_threshold)
+        except (OSError, json.JSONDecodeError, KeyError) as e:
+            logging.warning(f"Could not compare with previous report {args.compare}: {e}")
+
+    report_file = output_dir / REPORT_FILE
+    with report_file.open("w") as file:
+        json.dump(report, file, indent=2)
+    write_junit(report, output_dir / JUNIT_FILE)
+    logging.info(f"Reports written to {report_file} and {output_dir / JUNIT_FILE}")
+
+    success = log_summary(results, report["summary"])
+    if "comparison" in report:
+        log_comparison(report["comparison"])
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
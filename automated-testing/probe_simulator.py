@@ -0,0 +1,40 @@
+import argparse
+import json
+import sys
+
+import carla
+
+# Actor types which have to be destroyed by the scenario runner after every scenario
+LEAK_FILTERS = ("vehicle.*", "walker.*", "sensor.*", "controller.*")
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument(
+        '--host',
+        metavar='H',
+        default='carla-server',
+        help='IP of the host server (default: carla-server)')
+    argparser.add_argument('--timeout',
+                           metavar='T',
+                           default=5.0,
+                           type=float,
+                           help='Timeout of the server connection in seconds (default: 5)')
+    args = argparser.parse_args()
+
+    client = carla.Client(args.host, 2000)
+    client.set_timeout(args.timeout)
+    world = client.get_world()
+    actors = world.get_actors()
+
+    # the evaluator reads the last line of the output
+    print(json.dumps({
+        "world_id": world.id,
+        "actors": {actor_filter.split(".")[0]: len(actors.filter(actor_filter))
+                   for actor_filter in LEAK_FILTERS},
+    }))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
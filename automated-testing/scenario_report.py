@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import logging
+import math
+import re
+import statistics
+import sys
+import xml.etree.ElementTree as ET
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Optional
+
+# Summary line and timing rows of the scenario runner output
+RESULT_PATTERN = re.compile(r"Results of Scenario: (.*) -+ (SUCCESS|FAILURE)")
+SYSTEM_TIME_PATTERN = re.compile(r"Duration \(System Time\)\W+([\d.]+)s")
+GAME_TIME_PATTERN = re.compile(r"Duration \(Game Time\)\W+([\d.]+)s")
+
+# Relative drop of the real-time factor which is reported as a performance regression
+DEFAULT_REGRESSION_THRESHOLD = 0.1
+
+
+@dataclass
+class ScenarioResult:
+    scenario: str
+    worker: int
+    status: str
+    duration: float
+    log_file: Path
+    criteria: list[dict[str, Any]] = field(default_factory=list)
+    system_time: Optional[float] = None
+    game_time: Optional[float] = None
+
+    @property
+    def optional(self) -> bool:
+        return self.scenario.endswith(".opt")
+
+    @property
+    def real_time_factor(self) -> Optional[float]:
+        if self.system_time and self.game_time is not None:
+            return self.game_time / self.system_time
+        return None
+
+    @property
+    def failed_criteria(self) -> list[str]:
+        return [criterion["name"] for criterion in self.criteria
+                if not criterion.get("success") and not criterion.get("optional")]
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "scenario": self.scenario,
+            "optional": self.optional,
+            "worker": self.worker,
+            "status": self.status,
+            "duration": self.duration,
+            "system_time": self.system_time,
+            "game_time": self.game_time,
+            "real_time_factor": self.real_time_factor,
+            "criteria": self.criteria,
+            "log_file": str(self.log_file),
+        }
+
+
+def parse_scenario_output(output: str) -> dict[str, Any]:
+    """Extracts the overall result and the durations from the scenario runner output."""
+    values = {"success": None, "system_time": None, "game_time": None}
+    match = RESULT_PATTERN.search(output)
+    if match:
+        values["success"] = match.group(2) == "SUCCESS"
+    for key, pattern in (("system_time", SYSTEM_TIME_PATTERN), ("game_time", GAME_TIME_PATTERN)):
+        match = pattern.search(output)
+        if match:
+            values[key] = float(match.group(1))
+    return values
+
+
+def read_criteria(result_dir: Path) -> tuple[Optional[bool], list[dict[str, Any]]]:
+    # Written by the scenario runner with --json, named after the scenario in the OpenSCENARIO file
+    success, criteria = None, []
+    for json_file in sorted(result_dir.glob("*.json")):
+        try:
+            with json_file.open() as file:
+                report = json.load(file)
+        except (OSError, json.JSONDecodeError):
+            logging.warning(f"Could not read scenario runner report {json_file}")
+            continue
+        success = report.get("success", False) and success is not False
+        criteria.extend(report.get("criteria", []))
+    return success, criteria
+
+
+def describe(values: list[float]) -> Optional[dict[str, float]]:
+    values = sorted(value for value in values if value is not None)
+    if not values:
+        return None
+    return {
+        "mean": statistics.fmean(values),
+        "median": statistics.median(values),
+        "p95": values[max(0, math.ceil(0.95 * len(values)) - 1)],
+        "min": values[0],
+        "max": values[-1],
+    }
+
+
+def summarize(results: list[ScenarioResult], wall_time: float) -> dict[str, Any]:
+    statuses = Counter(result.status for result in results)
+    return {
+        "scenarios": len(results),
+        "passed": statuses["passed"],
+        "failed": statuses["failed"],
+        "errors": statuses["error"],
+        "pass_rate": statuses["passed"] / len(results) if results else 0.0,
+        "required_passed": all(result.status == "passed" for result in results
+                               if not result.optional),
+        "wall_time": wall_time,
+        "evaluation_time": sum(result.duration for result in results),
+        "simulation_time": sum(result.game_time or 0.0 for result in results),
+        "duration": describe([result.duration for result in results]),
+        "real_time_factor": describe([result.real_time_factor for result in results]),
+        "failed_criteria": dict(Counter(name for result in results
+                                        for name in result.failed_criteria)),
+    }
+
+
+def create_report(results: list[ScenarioResult], wall_time: float,
+                  metadata: dict[str, Any] = None) -> dict[str, Any]:
+    results = sorted(results, key=lambda result: result.scenario)
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        **(metadata or {}),
+        "summary": summarize(results, wall_time),
+        "scenarios": [result.to_dict() for result in results],
+    }
+
+
+def write_junit(report: dict[str, Any], path: Path) -> None:
+    # Failures of optional scenarios are allowed, so they are reported as skipped
+    scenarios = report["scenarios"]
+    unsuccessful = [scenario for scenario in scenarios if scenario["status"] != "passed"]
+    testsuite = ET.Element("testsuite", {
+        "name": "carlos-scenarios",
+        "tests": str(len(scenarios)),
+        "failures": str(sum(scenario["status"] == "failed" and not scenario["optional"]
+                            for scenario in unsuccessful)),
+        "errors": str(sum(scenario["status"] == "error" and not scenario["optional"]
+                          for scenario in unsuccessful)),
+        "skipped": str(sum(scenario["optional"] for scenario in unsuccessful)),
+        "time": f"{report['summary']['wall_time']:.3f}",
+        "timestamp": report["created_at"],
+    })
+    for scenario in scenarios:
+        testcase = ET.SubElement(testsuite, "testcase", {
+            "classname": "optional" if scenario["optional"] else "required",
+            "name": scenario["scenario"],
+            "time": f"{scenario['duration']:.3f}",
+        })
+        if scenario["real_time_factor"] is not None:
+            properties = ET.SubElement(testcase, "properties")
+            for key in ("system_time", "game_time", "real_time_factor"):
+                ET.SubElement(properties, "property", {"name": key, "value": f"{scenario[key]:.3f}"})
+        failed_criteria = [criterion for criterion in scenario["criteria"]
+                           if not criterion.get("success") and not criterion.get("optional")]
+        if scenario["status"] == "failed":
+            message = (", ".join(criterion["name"] for criterion in failed_criteria)
+                       or "Scenario failed")
+            details = "\n".join(
+                f"{criterion['name']} ({criterion.get('actor', '')}): "
+                f"expected {criterion.get('expected')}, actual {criterion.get('actual')}"
+                for criterion in failed_criteria)
+        elif scenario["status"] == "error":
+            message = f"Scenario runner did not report a result, see {scenario['log_file']}"
+            details = None
+        else:
+            continue
+        if scenario["optional"]:
+            element = ET.SubElement(testcase, "skipped",
+                                    {"message": f"Optional scenario {scenario['status']}: {message}"})
+        else:
+            element = ET.SubElement(testcase, "failure" if scenario["status"] == "failed" else "error",
+                                    {"message": message})
+        element.text = details
+    ET.indent(testsuite)
+    ET.ElementTree(testsuite).write(path, encoding="utf-8", xml_declaration=True)
+
+
+def compare_reports(report: dict[str, Any], previous: dict[str, Any],
+                    threshold: float = DEFAULT_REGRESSION_THRESHOLD) -> dict[str, Any]:
+    """Diffs the pass rate and the real-time factors of two reports."""
+    current_scenarios = {scenario["scenario"]: scenario for scenario in report["scenarios"]}
+    previous_scenarios = {scenario["scenario"]: scenario for scenario in previous["scenarios"]}
+    common = sorted(current_scenarios.keys() & previous_scenarios.keys())
+
+    regressions = []
+    for name in common:
+        current_factor = current_scenarios[name]["real_time_factor"]
+        previous_factor = previous_scenarios[name]["real_time_factor"]
+        if current_factor is None or not previous_factor:
+            continue
+        change = current_factor / previous_factor - 1
+        if change < -threshold:
+            regressions.append({"scenario": name, "previous": previous_factor,
+                                "current": current_factor, "change": change})
+
+    def mean_factor(summary: dict[str, Any]) -> Optional[float]:
+        return summary["real_time_factor"]["mean"] if summary["real_time_factor"] else None
+
+    return {
+        "previous_created_at": previous.get("created_at"),
+        "previous_simulator_image": previous.get("simulator_image"),
+        "pass_rate": {"previous": previous["summary"]["pass_rate"],
+                      "current": report["summary"]["pass_rate"],
+                      "change": report["summary"]["pass_rate"] - previous["summary"]["pass_rate"]},
+        "real_time_factor": {"previous": mean_factor(previous["summary"]),
+                             "current": mean_factor(report["summary"])},
+        "newly_failing": [name for name in common
+                          if previous_scenarios[name]["status"] == "passed"
+                          and current_scenarios[name]["status"] != "passed"],
+        "fixed": [name for name in common
+                  if previous_scenarios[name]["status"] != "passed"
+                  and current_scenarios[name]["status"] == "passed"],
+        "added": sorted(current_scenarios.keys() - previous_scenarios.keys()),
+        "removed": sorted(previous_scenarios.keys() - current_scenarios.keys()),
+        "performance_regressions": regressions,
+    }
+
+
+def log_comparison(comparison: dict[str, Any]) -> None:
+    pass_rate = comparison["pass_rate"]
+    logging.info(f"Pass rate {pass_rate['current']:.1%} "
+                 f"({pass_rate['change']:+.1%} compared to {comparison['previous_created_at']})")
+    factor = comparison["real_time_factor"]
+    if factor["current"] is not None and factor["previous"]:
+        logging.info(f"Mean real-time factor {factor['current']:.2f} "
+                     f"({factor['current'] / factor['previous'] - 1:+.1%})")
+    for name in comparison["newly_failing"]:
+        logging.warning(f"Scenario {name} passed previously")
+    for name in comparison["fixed"]:
+        logging.info(f"Scenario {name} failed previously")
+    for regression in comparison["performance_regressions"]:
+        logging.warning(f"Scenario {regression['scenario']} runs slower: real-time factor "
+                        f"{regression['previous']:.2f} -> {regression['current']:.2f} "
+                        f"({regression['change']:+.1%})")
+    if comparison["added"] or comparison["removed"]:
+        logging.info(f"{len(comparison['added'])} scenarios added, "
+                     f"{len(comparison['removed'])} scenarios removed")
+
+
+def load_report(path: Path) -> dict[str, Any]:
+    with Path(path).open() as file:
+        return json.load(file)
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Compare two scenario evaluation reports written by evaluate_scenarios.py")
+    parser.add_argument('report', help='Json report of the current evaluation')
+    parser.add_argument('--compare', metavar='PREVIOUS', required=True,
+                        help='Json report of a previous evaluation')
+    parser.add_argument('--regression-threshold', type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help='Relative drop of the real-time factor which is reported as regression '
+                             f'(default: {DEFAULT_REGRESSION_THRESHOLD})')
+    parser.add_argument('--json', action='store_true',
+                        help='Print the comparison as json')
+    return parser.parse_args()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_arguments()
+    try:
+        comparison = compare_reports(load_report(args.report), load_report(args.compare),
+                                     args.regression_threshold)
+    except (OSError, json.JSONDecodeError, KeyError) as e:
+        logging.error(f"Could not compare reports: {e}")
+        return 1
+    if args.json:
+        print(json.dumps(comparison, indent=2))
+    else:
+        log_comparison(comparison)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The evaluation scripts are plain modules without a package
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
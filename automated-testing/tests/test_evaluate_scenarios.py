@@ -0,0 +1,151 @@
+import argparse
+import subprocess
+from pathlib import Path
+
+import pytest
+
+import evaluate_scenarios
+from evaluate_scenarios import EvaluationWorker, ScenarioResult, parse_memory
+
+
+def make_worker(tmp_path, restart_policy="health", restart_every=0, max_memory_growth=2048):
+    args = argparse.Namespace(restart_policy=restart_policy, restart_every=restart_every,
+                              max_memory_growth=max_memory_growth)
+    return EvaluationWorker(0, tmp_path / "template.yml", {}, args, 0, tmp_path)
+
+
+def make_result(status="passed"):
+    return ScenarioResult("scenario.xosc", 0, status, 1.0, Path("scenario.xosc.log"))
+
+
+class FakeDocker:
+    """Answers the docker commands of a worker like a simulator in the given state."""
+
+    def __init__(self, running="true", health="healthy", memory="1.5GiB / 31GiB",
+                 actors='{"world_id": 1, "actors": {"vehicle": 0, "walker": 0}}', up_returncode=0):
+        self.running = running
+        self.health = health
+        self.memory = memory
+        self.actors = actors
+        self.up_returncode = up_returncode
+        self.commands = []
+
+    def __call__(self, command, **kwargs):
+        self.commands.append(command)
+        stdout, returncode = "", 0
+        if command[:2] == ["docker", "compose"]:
+            if "ps" in command:
+                stdout = "0123456789ab\n"
+            elif "up" in command:
+                returncode = self.up_returncode
+            elif "run" in command and "/probe_simulator.py" in " ".join(command):
+                stdout = "some log output\n" + self.actors + "\n"
+        elif command[:2] == ["docker", "inspect"]:
+            stdout = f"{self.running} {self.health}\n"
+        elif command[:2] == ["docker", "stats"]:
+            stdout = self.memory + "\n"
+        return subprocess.CompletedProcess(command, returncode, stdout, "error output")
+
+
+@pytest.fixture
+def docker(monkeypatch):
+    docker = FakeDocker()
+    monkeypatch.setattr(evaluate_scenarios.subprocess, "run", docker)
+    return docker
+
+
+def test_parse_memory():
+    assert parse_memory("1.5GiB") == 1.5 * 1024**3
+    assert parse_memory(" 512MiB ") == 512 * 1024**2
+    assert parse_memory("100kB") == 100000
+    assert parse_memory("--") == 0.0
+
+
+def test_restart_policy_defaults_to_health(monkeypatch):
+    monkeypatch.setattr("sys.argv", ["evaluate_scenarios.py"])
+    assert evaluate_scenarios.parse_arguments().restart_policy == "health"
+    monkeypatch.setattr("sys.argv", ["evaluate_scenarios.py", "-n"])
+    assert evaluate_scenarios.parse_arguments().restart_policy == "never"
+    monkeypatch.setattr("sys.argv", ["evaluate_scenarios.py", "--restart-policy", "always"])
+    assert evaluate_scenarios.parse_arguments().restart_policy == "always"
+
+
+def test_healthy_simulator_is_kept(tmp_path, docker):
+    worker = make_worker(tmp_path)
+    assert worker.start_simulator()
+    assert worker.get_restart_reason(make_result()) is None
+
+
+def test_always_policy_restarts_without_probing(tmp_path, docker):
+    worker = make_worker(tmp_path, "always")
+    assert worker.get_restart_reason(make_result()) is not None
+    assert docker.commands == []
+
+
+@pytest.mark.parametrize("restart_policy", ["health", "never"])
+@pytest.mark.parametrize("running, health", [("false", ""), ("true", "unhealthy")])
+def test_unhealthy_simulator_is_restarted(tmp_path, docker, restart_policy, running, health):
+    docker.running, docker.health = running, health
+    worker = make_worker(tmp_path, restart_policy)
+    assert worker.get_restart_reason(make_result()) == "simulator not healthy"
+
+
+def test_never_policy_ignores_failed_probes(tmp_path, docker):
+    docker.actors = '{"world_id": 1, "actors": {"vehicle": 2}}'
+    worker = make_worker(tmp_path, "never")
+    assert worker.get_restart_reason(make_result("error")) is None
+
+
+def test_health_policy_restarts_after_runner_errors(tmp_path, docker):
+    worker = make_worker(tmp_path)
+    assert worker.get_restart_reason(make_result("error")) == "scenario runner error"
+    assert worker.get_restart_reason(make_result("failed")) is None
+
+
+def test_health_policy_restarts_on_leaked_actors(tmp_path, docker):
+    docker.actors = '{"world_id": 1, "actors": {"vehicle": 2, "walker": 0, "sensor": 1}}'
+    worker = make_worker(tmp_path)
+    assert worker.get_restart_reason(make_result()) == "leaked actors 2 vehicle, 1 sensor"
+
+
+def test_health_policy_restarts_if_probe_fails(tmp_path, docker):
+    docker.actors = "Traceback (most recent call last):"
+    worker = make_worker(tmp_path)
+    assert worker.get_restart_reason(make_result()) == "simulator not responding"
+
+
+def test_health_policy_restarts_on_memory_growth(tmp_path, docker):
+    worker = make_worker(tmp_path, max_memory_growth=1024)
+    assert worker.start_simulator()
+    docker.memory = "2.4GiB / 31GiB"
+    assert worker.get_restart_reason(make_result()) is None
+    docker.memory = "2.6GiB / 31GiB"
+    assert worker.get_restart_reason(make_result()) == "memory grew by 1126MiB"
+
+
+def test_restart_every_n_scenarios(tmp_path, docker):
+    worker = make_worker(tmp_path, restart_every=2)
+    assert worker.start_simulator()
+    worker.scenarios_since_start = 1
+    assert worker.get_restart_reason(make_result()) is None
+    worker.scenarios_since_start = 2
+    assert worker.get_restart_reason(make_result()) == "2 scenarios since last restart"
+
+
+def test_failed_simulator_start_is_retried(tmp_path, docker):
+    docker.up_returncode = 1
+    worker = make_worker(tmp_path)
+    assert not worker.start_simulator()
+    up_commands = [command for command in docker.commands if "up" in command]
+    assert len(up_commands) == evaluate_scenarios.SIMULATOR_START_ATTEMPTS
+    assert all("--wait-timeout" in command for command in up_commands)
+
+
+def test_worker_stops_if_simulator_cannot_be_started(tmp_path, docker):
+    docker.up_returncode = 1
+    scenarios = evaluate_scenarios.queue.Queue()
+    scenarios.put("scenario.xosc")
+    results = []
+    make_worker(tmp_path).run(scenarios, results, evaluate_scenarios.threading.Lock())
+    assert results == []
+    assert scenarios.qsize() == 1
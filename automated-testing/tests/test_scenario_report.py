@@ -0,0 +1,139 @@
+import json
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import pytest
+
+from scenario_report import (ScenarioResult, compare_reports, create_report, parse_scenario_output,
+                             read_criteria, write_junit)
+
+# Tail of the scenario runner output with --output
+SCENARIO_RUNNER_OUTPUT = """
+ScenarioManager: Running scenario OpenScenario
+Terminating scenario ...
+
+======= Results of Scenario: FollowLeadingVehicle (ego: vehicle.lincoln.mkz_2020) ---- FAILURE =======
+╒═════════════════════════════════╤═════════════════════╕
+│ Start Time                      │ 2024-05-02 10:00:00 │
+│ End Time                        │ 2024-05-02 10:00:24 │
+│ Duration (System Time)          │ 24.5s               │
+│ Duration (Game Time)            │ 12.25s              │
+│ Ratio (System Time / Game Time) │ 0.5s                │
+╘═════════════════════════════════╧═════════════════════╛
+"""
+
+# Report of the scenario runner with --json
+SCENARIO_RUNNER_JSON = {
+    "scenario": "FollowLeadingVehicle",
+    "success": False,
+    "criteria": [
+        {"name": "CollisionTest", "actor": "lincoln.mkz_2020-182", "optional": False,
+         "expected": "0", "actual": "1", "success": False},
+        {"name": "RunningRedLightTest", "actor": "lincoln.mkz_2020-182", "optional": True,
+         "expected": "0", "actual": "1", "success": False},
+        {"name": "Duration", "actor": "all", "optional": False,
+         "expected": 60.0, "actual": 12.25, "success": True},
+    ],
+}
+
+
+def make_result(scenario, status, game_time=None, system_time=None, criteria=None):
+    return ScenarioResult(scenario, 0, status, 30.0, Path(f"{scenario}.log"),
+                          criteria or [], system_time, game_time)
+
+
+def test_parse_scenario_output():
+    assert parse_scenario_output(SCENARIO_RUNNER_OUTPUT) == {
+        "success": False, "system_time": 24.5, "game_time": 12.25}
+    assert parse_scenario_output("Error: could not connect to the server") == {
+        "success": None, "system_time": None, "game_time": None}
+
+
+def test_read_criteria(tmp_path):
+    assert read_criteria(tmp_path) == (None, [])
+
+    with (tmp_path / "FollowLeadingVehicle.json").open("w") as file:
+        json.dump(SCENARIO_RUNNER_JSON, file)
+    (tmp_path / "broken.json").write_text("{")
+    success, criteria = read_criteria(tmp_path)
+    assert success is False
+    assert [criterion["name"] for criterion in criteria] == [
+        "CollisionTest", "RunningRedLightTest", "Duration"]
+
+    result = make_result("a.xosc", "failed", criteria=criteria)
+    # optional criteria do not fail a scenario
+    assert result.failed_criteria == ["CollisionTest"]
+
+
+def test_report_summary():
+    results = [
+        make_result("a.xosc", "passed", game_time=10.0, system_time=5.0),
+        make_result("b.xosc", "failed", game_time=12.25, system_time=24.5,
+                    criteria=SCENARIO_RUNNER_JSON["criteria"]),
+        make_result("c.xosc.opt", "error"),
+    ]
+    report = create_report(results, 45.0, {"simulator_image": "carla:0.9.15"})
+    summary = report["summary"]
+
+    assert report["simulator_image"] == "carla:0.9.15"
+    assert [scenario["scenario"] for scenario in report["scenarios"]] == [
+        "a.xosc", "b.xosc", "c.xosc.opt"]
+    assert (summary["passed"], summary["failed"], summary["errors"]) == (1, 1, 1)
+    assert summary["pass_rate"] == pytest.approx(1 / 3)
+    assert not summary["required_passed"]
+    assert summary["simulation_time"] == pytest.approx(22.25)
+    assert summary["real_time_factor"]["min"] == pytest.approx(0.5)
+    assert summary["real_time_factor"]["max"] == pytest.approx(2.0)
+    assert summary["failed_criteria"] == {"CollisionTest": 1}
+
+
+def test_junit_reports_optional_failures_as_skipped(tmp_path):
+    results = [
+        make_result("a.xosc", "passed", game_time=10.0, system_time=5.0),
+        make_result("b.xosc", "failed", criteria=SCENARIO_RUNNER_JSON["criteria"]),
+        make_result("c.xosc", "error"),
+        make_result("d.xosc.opt", "failed", criteria=SCENARIO_RUNNER_JSON["criteria"]),
+        make_result("e.xosc.opt", "error"),
+        make_result("f.xosc.opt", "passed"),
+    ]
+    write_junit(create_report(results, 45.0), tmp_path / "report.xml")
+    testsuite = ET.parse(tmp_path / "report.xml").getroot()
+
+    assert testsuite.attrib["tests"] == "6"
+    assert testsuite.attrib["failures"] == "1"
+    assert testsuite.attrib["errors"] == "1"
+    assert testsuite.attrib["skipped"] == "2"
+    testcases = {testcase.attrib["name"]: testcase for testcase in testsuite}
+    assert [child.tag for child in testcases["a.xosc"]] == ["properties"]
+    assert testcases["b.xosc"].find("failure").attrib["message"] == "CollisionTest"
+    assert testcases["c.xosc"].find("error") is not None
+    for name in ("d.xosc.opt", "e.xosc.opt"):
+        assert testcases[name].find("failure") is None
+        assert testcases[name].find("error") is None
+        assert testcases[name].find("skipped").attrib["message"].startswith("Optional scenario")
+    assert len(testcases["f.xosc.opt"]) == 0
+
+
+def test_compare_reports():
+    previous = create_report([
+        make_result("a.xosc", "passed", game_time=10.0, system_time=5.0),
+        make_result("b.xosc", "failed", game_time=10.0, system_time=10.0),
+        make_result("c.xosc", "passed", game_time=10.0, system_time=10.0),
+        make_result("removed.xosc", "passed"),
+    ], 40.0)
+    report = create_report([
+        make_result("a.xosc", "passed", game_time=10.0, system_time=10.0),
+        make_result("b.xosc", "passed", game_time=10.0, system_time=10.5),
+        make_result("c.xosc", "failed", game_time=10.0, system_time=10.0),
+        make_result("added.xosc", "passed"),
+    ], 40.0)
+
+    comparison = compare_reports(report, previous, threshold=0.1)
+    assert comparison["pass_rate"] == {"previous": 0.75, "current": 0.75, "change": 0.0}
+    assert comparison["newly_failing"] == ["c.xosc"]
+    assert comparison["fixed"] == ["b.xosc"]
+    assert comparison["added"] == ["added.xosc"]
+    assert comparison["removed"] == ["removed.xosc"]
+    # only a.xosc dropped by more than 10% from 2.0 to 1.0
+    assert [regression["scenario"] for regression in comparison["performance_regressions"]] == ["a.xosc"]
+    assert comparison["performance_regressions"][0]["change"] == pytest.approx(-0.5)
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+from python_on_whales import DockerException
+
+import data_generation
+from run_manifest import RunManifest
+from setup_sampling import generate_setups
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Synthetic setup parameter which enlarges the sweep to the requested number of setups
+BENCHMARK_PARAMETER = "benchmark_index"
+
+
+class FakeCompose:
+    """Stand-in for the compose API which only sleeps for the configured latencies."""
+
+    def __init__(self, backend: "FakeDockerBackend", project_name: str):
+        self.backend = backend
+        self.project_name = project_name
+        self.rng = random.Random(f"{backend.seed}-{project_name}")
+        self.events = []
+        self.running_services = set()
+
+    def _sleep(self, latency: float) -> None:
+        if latency > 0:
+            time.sleep(max(0.0, self.rng.gauss(latency, latency * self.backend.jitter)))
+
+    def _record(self, services: list[str], action: str) -> None:
+        for service in services:
+            self.events.append(SimpleNamespace(
+                type="container", action=action, time=datetime.now(),
+                actor=SimpleNamespace(attributes={
+                    "com.docker.compose.project": self.project_name or "",
+                    "com.docker.compose.project.working_dir": os.getcwd(),
+                    "com.docker.compose.service": service})))
+
+    def up(self, services: list[str] = None, detach: bool = False,
+           abort_on_container_exit: bool = False, wait: bool = False) -> None:
+        services = services or []
+        self._record(services, "create")
+        self._record(services, "start")
+        self.running_services.update(services)
+        if detach:
+            self._sleep(self.backend.server_start_latency)
+            return
+        self._sleep(self.backend.run_latency)
+        if self.rng.random() < self.backend.failure_rate:
+            self._record(services, "die")
+            raise DockerException(["docker", "compose", "up"], 1)
+        self._record(services, "die")
+        self.running_services.difference_update(services)
+
+    def down(self) -> None:
+        self._sleep(self.backend.teardown_latency)
+        self._record(sorted(self.running_services), "destroy")
+        self.running_services.clear()
+
+    def rm(self, services: list[str] = None, stop: bool = False) -> None:
+        self._sleep(self.backend.teardown_latency)
+        self._record(services or [], "destroy")
+        self.running_services.difference_update(services or [])
+
+    def run(self, service: str, command: list[str] = None, remove: bool = False,
+            tty: bool = True, dependencies: bool = True) -> None:
+        self._sleep(self.backend.reset_latency)
+
+    def ps(self, services: list[str] = None) -> list[SimpleNamespace]:
+        return [SimpleNamespace(state=SimpleNamespace(running=True, health=None))
+                for service in services or [] if service in self.running_services]
+
+    def kill(self) -> None:
+        self.running_services.clear()
+
+
+class FakeSystem:
+
+    def __init__(self, compose: FakeCompose):
+        self.compose = compose
+
+    def events(self, since: datetime = None, until: datetime = None,
+               filters: dict[str, str] = None) -> list[SimpleNamespace]:
+        # Only events of the finished run are needed, older ones are dropped to keep memory flat
+        events = [event for event in self.compose.events
+                  if (since is None or event.time >= since) and (until is None or event.time <= until)]
+        self.compose.events = []
+        return events
+
+
+class FakeDockerClient:
+
+    def __init__(self, backend: "FakeDockerBackend", project_name: str = None):
+        self.client_config = SimpleNamespace(compose_project_name=project_name)
+        self.compose = FakeCompose(backend, project_name)
+        self.system = FakeSystem(self.compose)
+
+
+class FakeDockerBackend:
+    """Picklable client factory which can replace data_generation.setup_docker_client."""
+
+    def __init__(self, run_latency: float = 0.0, teardown_latency: float = 0.0,
+                 server_start_latency: float = 0.0, reset_latency: float = 0.0,
+                 jitter: float = 0.0, failure_rate: float = 0.0, seed: int = 0):
+        self.run_latency = run_latency
+        self.teardown_latency = teardown_latency
+        self.server_start_latency = server_start_latency
+        self.reset_latency = reset_latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.seed = seed
+
+    def __call__(self, docker_compose_file: Path = None, project_name: str = None,
+                 pinned_images_file: Path = None) -> FakeDockerClient:
+        return FakeDockerClient(self, project_name)
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the orchestration of data_generation.py against a fake Docker backend")
+    parser.add_argument(
+        '--config',
+        metavar='C',
+        default='./config/data-driven-development-demo-permutation-execution.yml',
+        help='Config file whose settings are used for the sweep')
+    parser.add_argument('--num_setups', type=int, default=10000,
+                        help='Number of simulation setups of the sweep (default: 10000)')
+    parser.add_argument('--max_parallel_runs', type=int, default=1,
+                        help='Number of concurrent simulation runs (default: 1)')
+    parser.add_argument('--persistent_server', action='store_true',
+                        help='Keep the fake simulator running across runs')
+    parser.add_argument('--run_latency', type=float, default=0.0,
+                        help='Simulated duration of a run in seconds (default: 0)')
+    parser.add_argument('--teardown_latency', type=float, default=0.0,
+                        help='Simulated duration of compose down in seconds (default: 0)')
+    parser.add_argument('--server_start_latency', type=float, default=0.0,
+                        help='Simulated start time of a persistent simulator in seconds (default: 0)')
+    parser.add_argument('--reset_latency', type=float, default=0.0,
+                        help='Simulated world reset time of a persistent simulator in seconds (default: 0)')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='Relative standard deviation of all latencies (default: 0)')
+    parser.add_argument('--failure_rate', type=float, default=0.0,
+                        help='Probability of a failing run (default: 0)')
+    parser.add_argument('--real_run_time', type=float, default=300.0,
+                        help='Run duration in seconds used to project the throughput (default: 300)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the simulated latencies and failures (default: 0)')
+    parser.add_argument('--output', metavar='O', default=None,
+                        help='Json file to store the benchmark report')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Keep the log messages of every simulation run')
+    return parser.parse_args()
+
+
+def expand_setups(run_settings: dict[str, Any], num_setups: int) -> list[dict[str, Any]]:
+    for setting_key in ("permutation_settings", "scenario_settings"):
+        if setting_key in run_settings:
+            parameters = dict(run_settings[setting_key])
+            break
+    else:
+        logging.error("Config contains neither permutation_settings nor scenario_settings")
+        sys.exit(1)
+    num_combinations = math.prod(len(values) for values in parameters.values())
+    parameters[BENCHMARK_PARAMETER] = [str(i) for i in range(math.ceil(num_setups / num_combinations))]
+    return list(generate_setups(parameters, {"num_samples": num_setups}))
+
+
+def main():
+    args = parse_arguments()
+    general_settings, run_settings = data_generation.load_config(Path(args.config))
+    backend = FakeDockerBackend(args.run_latency, args.teardown_latency,
+                                args.server_start_latency, args.reset_latency,
+                                args.jitter, args.failure_rate, args.seed)
+
+    with tempfile.TemporaryDirectory() as output_path:
+        general_settings["output_path"] = output_path
+        general_settings.update(max_parallel_runs=args.max_parallel_runs,
+                                persistent_server=args.persistent_server,
+                                pull_images=False)
+
+        tracemalloc.start()
+        start_time = time.perf_counter()
+        general_settings, simulation_services, _, execution_settings = \
+            data_generation.prepare_general_settings(general_settings)
+        run_settings.pop("num_executions", None)
+        run_settings.pop("sampling", None)
+        data_generation.check_run_settings(run_settings, simulation_services)
+        simulation_runs = [(0, simulation_setup)
+                           for simulation_setup in expand_setups(run_settings, args.num_setups)]
+        simulation_runs = data_generation.schedule_setups(simulation_runs)
+        expansion_time = time.perf_counter() - start_time
+
+        manifest = RunManifest.for_output_path(output_path)
+        memory_samples = []
+        sample_interval = max(1, len(simulation_runs) // 20)
+        baseline_memory = tracemalloc.get_traced_memory()[0]
+
+        def handle_result(result: dict[str, Any]) -> None:
+            # Same bookkeeping as data_generation.main
+            manifest.register(result, output_path)
+            data_generation.write_trace_events(output_path, result["events"])
+            handle_result.count += 1
+            if handle_result.count % sample_interval == 0:
+                memory_samples.append(
+                    (handle_result.count, tracemalloc.get_traced_memory()[0] - baseline_memory))
+        handle_result.count = 0
+
+        logging.info(f"Running {len(simulation_runs)} fake simulation runs with "
+                     f"{args.max_parallel_runs} concurrent runs...")
+        if not args.verbose:
+            logging.disable(logging.ERROR)
+        start_time = time.perf_counter()
+        if args.max_parallel_runs > 1:
+            results = data_generation.run_setups_in_parallel(
+                general_settings, simulation_runs, simulation_services,
+                execution_settings, {}, None, handle_result, backend)
+        else:
+            results = data_generation.run_setups_sequentially(
+                backend(), general_settings, simulation_runs, simulation_services,
+                execution_settings, {}, handle_result)
+        sweep_time = time.perf_counter() - start_time
+        logging.disable(logging.NOTSET)
+        manifest.close()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    # Time spent in orchestration phases is simulated work, everything else is overhead
+    busy_time = sum(event["end"] - event["start"] for result in results
+                    for event in result["events"] if event["event"] == "phase")
+    overhead_per_run = max(0.0, sweep_time * args.max_parallel_runs - busy_time) / len(results)
+    report = {
+        "num_runs": len(results),
+        "failed_runs": sum(result["status"] != "completed" for result in results),
+        "max_parallel_runs": args.max_parallel_runs,
+        "expansion_time": expansion_time,
+        "sweep_time": sweep_time,
+        "overhead_per_run": overhead_per_run,
+        "throughput_runs_per_hour": len(results) / sweep_time * 3600,
+        "projected_runs_per_hour": args.max_parallel_runs * 3600 /
+        (args.real_run_time + overhead_per_run),
+        "memory_samples": memory_samples,
+        "memory_growth_per_1000_runs": (
+            (memory_samples[-1][1] - memory_samples[0][1]) /
+            (memory_samples[-1][0] - memory_samples[0][0]) * 1000
+            if len(memory_samples) > 1 else 0.0),
+        "peak_traced_memory": peak_memory,
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+    logging.info(f"Setup expansion and scheduling: {expansion_time * 1000:.1f}ms")
+    logging.info(f"Sweep: {report['num_runs']} runs ({report['failed_runs']} failed) "
+                 f"in {sweep_time:.1f}s")
+    logging.info(f"Orchestration overhead: {overhead_per_run * 1000:.1f}ms per run")
+    logging.info(f"Throughput: {report['throughput_runs_per_hour']:.0f} runs/hour measured, "
+                 f"{report['projected_runs_per_hour']:.1f} runs/hour projected for "
+                 f"{args.real_run_time:.0f}s runs")
+    logging.info(f"Memory growth of the main process: "
+                 f"{report['memory_growth_per_1000_runs'] / 1024:.1f} KiB per 1000 runs, "
+                 f"peak {peak_memory / 1024 ** 2:.1f} MiB traced")
+    if args.max_parallel_runs > 1:
+        logging.info("Memory of the worker processes is not traced")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,70 @@
 #!/usr/bin/env python3
 
 import argparse
-import itertools
+import hashlib
 import json
 import logging
+import math
+import multiprocessing
 import os
 import sys
+import time
 import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Iterator, Optional
 
 import yaml
 from python_on_whales import DockerClient, DockerException
 
+from run_manifest import RunManifest
+from setup_sampling import SAMPLING_STRATEGIES, generate_setups
+
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
+COMPOSE_PROJECT_PREFIX = "carlos-data-generation"
+CONVERSION_PROJECT_NAME = f"{COMPOSE_PROJECT_PREFIX}-convert"
+SIMULATOR_SERVICE = "carla-server"
+WORLD_RESET_SERVICE = "carla-world-reset"
+WORLD_RESET_MODES = ("reload", "cleanup")
+
+# Settings which configure the orchestration itself and are not passed to Docker Compose
+EXECUTION_SETTINGS_DEFAULTS = {
+    "max_parallel_runs": 1,
+    "persistent_server": False,
+    "server_restart_interval": 0,
+    # The ROS bridge loads the town of every run itself, a reload would load the map twice
+    "world_reset": "cleanup",
+    "reorder_setups": True,
+    "pull_images": True,
+    "max_parallel_conversions": 1,
+    "resume": True,
+}
+
+# Time controller arguments which configure conditions to end a run early
+STOP_CONDITION_ARGS = ("min_frames", "min_distance", "max_stationary_time",
+                   "stop_on_collision", "ego_role_name")
+
+# Container state transitions which are captured in the timing trace
+TRACED_CONTAINER_ACTIONS = ("create", "start", "health_status: healthy",
+                            "health_status: unhealthy", "die", "destroy")
+TRACE_FILE = "trace.jsonl"
+
+# Setup parameters referencing files whose contents are part of the setup hash
+HASHED_FILE_KEYS = ("sensors_file", "scenario_file")
+# General settings which do not change the recorded data of a run
+UNHASHED_GENERAL_SETTINGS = ("output_path",)
+
+# Setup parameters which are expensive to change between consecutive runs, most expensive first
+SCHEDULING_KEYS = ("town", "sensors_file")
+
+# Docker client and simulator of the compose project owned by a worker process (parallel execution only)
+_worker_docker_client = None
+_worker_server = None
+
 
 def parse_arguments() -> argparse.Namespace:
     parser = argparse.ArgumentParser()
@@ -48,34 +97,327 @@ def load_config(
 
 def prepare_general_settings(
     general_settings: dict[str, Any]
-) -> tuple[dict[str, Any], list[str], list[str]]:
+) -> tuple[dict[str, Any], list[str], list[str], dict[str, Any]]:
     # Convert required settings to CLI arguments
     cli_args = ["max_real_time", "max_simulation_time"]
     for key in cli_args:
         if key in general_settings:
             general_settings[key] = f"--{key} {general_settings[key]}"
+    # Convert optional stop conditions to CLI arguments of the time controller
+    stop_conditions = general_settings.pop("stop_conditions", None) or {}
+    for key in stop_conditions:
+        if key not in STOP_CONDITION_ARGS:
+            logging.error(
+                f"Unknown stop condition {key}, expected one of {', '.join(STOP_CONDITION_ARGS)}")
+            sys.exit(1)
+    general_settings["stop_conditions"] = " ".join(
+        (f"--{key}" if value is True else f"--{key} {value}")
+        for key, value in stop_conditions.items() if value is not False)
     # Set default output path if required
     if "output_path" not in general_settings:
         general_settings["output_path"] = "./data/"
+    # Mounted into the time controller, create it before Docker does as root
+    os.makedirs(os.path.join(general_settings["output_path"], "metadata"), exist_ok=True)
     if "record_topics" in general_settings:
         output_path = general_settings["output_path"]
         if not os.path.exists(output_path):
             os.makedirs(output_path)
-        # Flatten all topics into a single argument
-        general_settings["record_topics"] = " ".join(
-            general_settings["record_topics"].values())
+        # Keep single topics for convert services and flatten all topics into a single argument
+        record_topics = general_settings["record_topics"]
+        general_settings.update(record_topics)
+        general_settings["record_topics"] = " ".join(record_topics.values())
     # Separate simulation and convert services as they are required somewhere else
     simulation_services = general_settings.pop("simulation_services", None)
     convert_services = general_settings.pop("convert_services", None)
-    return general_settings, simulation_services, convert_services
+    # Separate execution settings as they are only used by the orchestration
+    execution_settings = {
+        key: general_settings.pop(key, default)
+        for key, default in EXECUTION_SETTINGS_DEFAULTS.items()
+    }
+    execution_settings["max_parallel_runs"] = int(
+        execution_settings["max_parallel_runs"])
+    if execution_settings["max_parallel_runs"] < 1:
+        logging.error("max_parallel_runs must be a positive integer")
+        sys.exit(1)
+    execution_settings["server_restart_interval"] = int(
+        execution_settings["server_restart_interval"])
+    execution_settings["max_parallel_conversions"] = int(
+        execution_settings["max_parallel_conversions"])
+    if execution_settings["world_reset"] not in WORLD_RESET_MODES:
+        logging.error(
+            f"world_reset must be one of {', '.join(WORLD_RESET_MODES)}")
+        sys.exit(1)
+    return general_settings, simulation_services, convert_services, execution_settings
 
 
 def setup_docker_client(docker_compose_file: Path = Path(
-        './docker-compose.yml')) -> DockerClient:
+        './docker-compose.yml'), project_name: str = None,
+        pinned_images_file: Path = None) -> DockerClient:
     if not docker_compose_file.exists():
         logging.error(f"Docker Compose file not found: {docker_compose_file}")
         sys.exit(1)
-    return DockerClient(compose_files=[docker_compose_file])
+    compose_files = [docker_compose_file]
+    if pinned_images_file:
+        compose_files.append(pinned_images_file)
+    return DockerClient(compose_files=compose_files,
+                        compose_project_name=project_name)
+
+
+def get_image_digest(docker_client: DockerClient, image: str) -> str:
+    repository = image.split("@")[0]
+    if ":" in repository.rsplit("/", 1)[-1]:
+        repository = repository.rsplit(":", 1)[0]
+    inspected_image = docker_client.image.inspect(image)
+    for repo_digest in inspected_image.repo_digests:
+        if repo_digest.split("@")[0] == repository:
+            return repo_digest
+    # Images which were never pushed to or pulled from a registry have no digest
+    return inspected_image.id
+
+
+def resolve_images(docker_client: DockerClient,
+                   general_settings: dict[str, Any],
+                   services: list[str],
+                   pull_images: bool = True) -> dict[str, str]:
+    # Compose requires the general settings to interpolate the service definitions
+    os.environ.update(general_settings)
+    service_configs = docker_client.compose.config(return_json=True)["services"]
+    images = {service: service_configs[service]["image"] for service in services}
+
+    if pull_images:
+        logging.info(f"Pulling images of {', '.join(services)}...")
+        docker_client.compose.pull(services=services)
+    try:
+        return {service: get_image_digest(docker_client, image)
+                for service, image in images.items()}
+    except DockerException as e:
+        logging.error(f"Image not available locally, enable pull_images: {e}")
+        sys.exit(1)
+
+
+def write_pinned_images_file(images: dict[str, str], output_path: str) -> Path:
+    os.makedirs(output_path, exist_ok=True)
+    pinned_images_file = Path(output_path) / "pinned-images.yml"
+    with pinned_images_file.open("w") as file:
+        yaml.safe_dump({"services": {service: {"image": image}
+                                     for service, image in images.items()}}, file)
+    return pinned_images_file
+
+
+class PhaseTimer:
+    """Collects timing events of consecutive orchestration phases."""
+
+    def __init__(self, run_name: str = None):
+        self.run_name = run_name
+        self.events = []
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.events.append({"event": "phase", "run_name": self.run_name,
+                                "phase": name, "start": start, "end": time.time()})
+
+    @property
+    def timings(self) -> dict[str, float]:
+        return {event["phase"]: event["end"] - event["start"]
+                for event in self.events if event["event"] == "phase"}
+
+
+def get_container_events(docker_client: DockerClient,
+                         run_name: str,
+                         since: float,
+                         until: float) -> list[dict[str, Any]]:
+    # Only containers of this compose project, the default project is identified by its directory
+    project_name = docker_client.client_config.compose_project_name
+    events = []
+    for event in docker_client.system.events(since=datetime.fromtimestamp(since),
+                                             until=datetime.fromtimestamp(until),
+                                             filters={"type": "container"}):
+        attributes = event.actor.attributes
+        if project_name:
+            if attributes.get("com.docker.compose.project") != project_name:
+                continue
+        elif attributes.get("com.docker.compose.project.working_dir") != os.getcwd():
+            continue
+        if event.action not in TRACED_CONTAINER_ACTIONS or \
+                "com.docker.compose.service" not in attributes:
+            continue
+        events.append({"event": "container", "run_name": run_name,
+                       "service": attributes["com.docker.compose.service"],
+                       "action": event.action, "time": event.time.timestamp()})
+    return events
+
+
+def get_container_timings(events: list[dict[str, Any]]) -> dict[str, float]:
+    # Durations from the first start of a service until it was healthy and until it died
+    first_events = {}
+    for event in events:
+        if event["event"] == "container":
+            first_events.setdefault((event["service"], event["action"]), event["time"])
+    timings = {}
+    for (service, action), start in first_events.items():
+        if action != "start":
+            continue
+        if (service, "health_status: healthy") in first_events:
+            timings[f"{service}.healthy"] = first_events[(service, "health_status: healthy")] - start
+        if (service, "die") in first_events:
+            timings[f"{service}.running"] = first_events[(service, "die")] - start
+    return timings
+
+
+def write_trace_events(output_path: str, events: list[dict[str, Any]]) -> None:
+    with (Path(output_path) / TRACE_FILE).open("a") as file:
+        for event in events:
+            file.write(json.dumps(event) + "\n")
+
+
+def percentile(values: list[float], q: float) -> float:
+    # Nearest-rank percentile
+    values = sorted(values)
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def log_phase_summary(results: list[dict[str, Any]],
+                      sweep_timings: Optional[dict[str, float]] = None) -> None:
+    phase_durations = {}
+    for result in results:
+        for phase, duration in result.get("timings", {}).items():
+            phase_durations.setdefault(phase, []).append(duration)
+    if phase_durations:
+        logging.info("Phase durations across all runs (p50 / p95 / max):")
+        for phase, durations in sorted(phase_durations.items()):
+            logging.info(
+                f"  {phase}: {percentile(durations, 50):.1f}s / {percentile(durations, 95):.1f}s / "
+                f"{max(durations):.1f}s ({len(durations)} runs)")
+    # Phases which run once per sweep, e.g. the image pull
+    if sweep_timings:
+        logging.info("Phase durations of the sweep:")
+        for phase, duration in sorted(sweep_timings.items()):
+            logging.info(f"  {phase}: {duration:.1f}s")
+
+
+def get_end_report_file(output_path: str, run_name: str) -> Path:
+    # Written by the time controller when a run ends
+    return Path(output_path) / "metadata" / f"{run_name}-end.json"
+
+
+def write_run_metadata(output_path: str, result: dict[str, Any]) -> None:
+    metadata_path = Path(output_path) / "metadata"
+    metadata_path.mkdir(parents=True, exist_ok=True)
+    with (metadata_path / f"{result['run_name']}.json").open("w") as file:
+        json.dump(result, file, indent=2)
+
+
+def get_scheduling_key(simulation_setup: dict[str, Any]) -> tuple[str, ...]:
+    scheduling_values = dict(simulation_setup)
+    if "scenario_file" in scheduling_values:
+        scheduling_values["town"] = get_scenario_town(
+            validate_file(scheduling_values["scenario_file"], ".xosc"))
+    return tuple(str(scheduling_values.get(key)) for key in SCHEDULING_KEYS)
+
+
+def count_map_switches(simulation_runs: list[tuple[int, dict[Any]]]) -> int:
+    towns = [get_scheduling_key(simulation_setup)[0]
+             for _, simulation_setup in simulation_runs]
+    return sum(town != previous_town
+               for previous_town, town in zip(towns, towns[1:]))
+
+
+def schedule_setups(simulation_runs: list[tuple[int, dict[Any]]]) -> list[tuple[int, dict[Any]]]:
+    # Sort hierarchically by the expensive parameters, the town being the outermost one.
+    # Values of every parameter keep their order of first appearance and
+    # repeated executions of a setup are kept next to each other
+    scheduling_keys = {}
+    value_order = [{} for _ in SCHEDULING_KEYS]
+    setup_order = {}
+    for _, simulation_setup in simulation_runs:
+        if id(simulation_setup) not in setup_order:
+            setup_order[id(simulation_setup)] = len(setup_order)
+            scheduling_keys[id(simulation_setup)] = get_scheduling_key(simulation_setup)
+            for order, value in zip(value_order, scheduling_keys[id(simulation_setup)]):
+                order.setdefault(value, len(order))
+
+    return sorted(simulation_runs,
+                  key=lambda run: (*(order[value] for order, value in
+                                     zip(value_order, scheduling_keys[id(run[1])])),
+                                   setup_order[id(run[1])],
+                                   run[0]))
+
+
+class PersistentServer:
+    """Keeps the simulator of a compose project running across simulation runs."""
+
+    def __init__(self, docker_client: DockerClient, restart_interval: int = 0,
+                 world_reset: str = "cleanup") -> None:
+        self.docker_client = docker_client
+        self.restart_interval = restart_interval
+        self.world_reset = world_reset
+        self.runs_since_start = 0
+        self.is_running = False
+
+    def start(self) -> None:
+        logging.info("Starting persistent simulator...")
+        self.docker_client.compose.up(services=[SIMULATOR_SERVICE],
+                                      detach=True,
+                                      wait=True)
+        self.is_running = True
+        self.runs_since_start = 0
+
+    def stop(self) -> None:
+        self.docker_client.compose.down()
+        self.is_running = False
+
+    def is_healthy(self) -> bool:
+        containers = self.docker_client.compose.ps(services=[SIMULATOR_SERVICE])
+        return any(container.state.running and
+                   (container.state.health is None or
+                    container.state.health.status == "healthy")
+                   for container in containers)
+
+    def reset_world(self) -> None:
+        try:
+            self.docker_client.compose.run(
+                WORLD_RESET_SERVICE,
+                command=["bash", "-ic",
+                         f"python reset_world.py --host {SIMULATOR_SERVICE} --mode {self.world_reset}"],
+                remove=True,
+                tty=False)
+        except DockerException:
+            logging.warning("World reset failed, restarting simulator...")
+            self.stop()
+            self.start()
+
+    def prepare_run(self) -> None:
+        if self.is_running and not self.is_healthy():
+            logging.warning("Simulator is unhealthy, restarting...")
+            self.stop()
+        elif (self.is_running and self.restart_interval > 0 and
+              self.runs_since_start >= self.restart_interval):
+            logging.info(
+                f"Simulator served {self.runs_since_start} runs, restarting...")
+            self.stop()
+
+        if not self.is_running:
+            self.start()
+        elif self.runs_since_start > 0:
+            self.reset_world()
+        self.runs_since_start += 1
+
+    def release_run(self, services: list[str]) -> None:
+        # Only remove the per-run services, the simulator keeps running
+        self.docker_client.compose.rm(services=services, stop=True)
+
+
+def setup_persistent_server(docker_client: DockerClient,
+                            execution_settings: dict[str, Any]) -> PersistentServer:
+    if not execution_settings["persistent_server"]:
+        return None
+    return PersistentServer(docker_client,
+                            execution_settings["server_restart_interval"],
+                            execution_settings["world_reset"])
 
 
 def check_run_settings(run_settings: dict[Any], simulation_services: list[str]) -> None:
@@ -100,6 +442,19 @@ def check_run_settings(run_settings: dict[Any], simulation_services: list[str])
                 sys.exit(1)
 
 
+def check_sampling(sampling: dict[str, Any]) -> None:
+    if not sampling:
+        return
+    strategy = sampling.get("strategy", "full")
+    if strategy not in SAMPLING_STRATEGIES:
+        logging.error(
+            f"sampling strategy must be one of {', '.join(SAMPLING_STRATEGIES)}")
+        sys.exit(1)
+    if strategy in ("random", "latin_hypercube") and "num_samples" not in sampling:
+        logging.error(f"num_samples is required for {strategy} sampling")
+        sys.exit(1)
+
+
 def validate_file(file: str, suffix: str = None) -> str:
     if not file:
         logging.error("No file specified")
@@ -144,6 +499,13 @@ def prepare_controller(simulation_setup: dict[str, Any]) -> dict[str, Any]:
     return simulation_setup
 
 
+def get_scenario_town(scenario_file: str) -> str:
+    tree = ET.parse(scenario_file)
+    root = tree.getroot()
+    elem = root.find('./RoadNetwork/LogicFile')
+    return elem.get('filepath')
+
+
 def prepare_scenario(simulation_setup: dict[str, Any]) -> dict[str, Any]:
     if "scenario_file" in simulation_setup:
         scenario_file = simulation_setup.pop("scenario_file")
@@ -156,23 +518,55 @@ def prepare_scenario(simulation_setup: dict[str, Any]) -> dict[str, Any]:
         simulation_setup["scenario_file"] = os.path.basename(scenario_file)
 
         # get town from scenario file
-        tree = ET.parse(scenario_file)
-        root = tree.getroot()
-        elem = root.find('./RoadNetwork/LogicFile')
-        simulation_setup["town"] = elem.get('filepath')
+        simulation_setup["town"] = get_scenario_town(scenario_file)
 
     return simulation_setup
 
 
-def simulate_setup(docker_client: DockerClient,
-                   general_settings: dict[Any],
-                   simulation_setup: dict[Any],
-                   simulation_services: list[str]) -> None:
+def get_setup_hash(simulation_setup: dict[Any], execution: int = 0,
+                   general_settings: Optional[dict[str, Any]] = None,
+                   simulation_services: Optional[list[str]] = None) -> str:
+    """Hashes everything which determines the recorded data of a run.
+
+    Covers the parameters, the contents of the referenced sensors and scenario
+    files, the simulation services and the general settings such as time limits,
+    stop conditions and recorded topics. The output path is left out, it does
+    not change the recorded data.
+    """
+    run_settings = {key: value for key, value in (general_settings or {}).items()
+                    if key not in UNHASHED_GENERAL_SETTINGS}
+    setup_hash = hashlib.sha256(json.dumps(
+        {"setup": simulation_setup, "execution": execution,
+         "general_settings": run_settings, "simulation_services": simulation_services},
+        sort_keys=True, default=str).encode())
+    for key in HASHED_FILE_KEYS:
+        if key in simulation_setup and Path(simulation_setup[key]).is_file():
+            setup_hash.update(Path(simulation_setup[key]).read_bytes())
+    return setup_hash.hexdigest()
+
+
+def get_run_name(simulation_setup: dict[Any], execution: int = 0) -> str:
     run_name = '_'.join(
         Path(str(value)).stem if Path(
             str(value)).parent != Path('.') else str(value)
         for value in simulation_setup.values()
     )
+    if execution > 0:
+        run_name = f"{run_name}_{execution}"
+    return run_name
+
+
+def simulate_setup(docker_client: DockerClient,
+                   general_settings: dict[Any],
+                   simulation_setup: dict[Any],
+                   simulation_services: list[str],
+                   execution: int = 0,
+                   server: PersistentServer = None,
+                   timer: PhaseTimer = None) -> None:
+    # Work on a copy as the same setup is reused for every execution
+    simulation_setup = dict(simulation_setup)
+    run_name = get_run_name(simulation_setup, execution)
+    timer = timer or PhaseTimer(run_name)
 
     simulation_setup["sensors_file"] = validate_file(
         simulation_setup["sensors_file"], ".json")
@@ -187,46 +581,328 @@ def simulate_setup(docker_client: DockerClient,
 
     os.environ.update(simulation_args)
     logging.info(f"Running simulation setup {run_name}")
-    docker_client.compose.pull()
-    docker_client.compose.up(abort_on_container_exit=True,
-                             services=simulation_services)
-    docker_client.compose.down()
+    if server:
+        run_services = [service for service in simulation_services
+                        if service != SIMULATOR_SERVICE]
+        with timer.phase("prepare"):
+            server.prepare_run()
+        with timer.phase("simulation"):
+            docker_client.compose.up(abort_on_container_exit=True,
+                                     services=run_services)
+        with timer.phase("teardown"):
+            server.release_run(run_services)
+    else:
+        with timer.phase("simulation"):
+            docker_client.compose.up(abort_on_container_exit=True,
+                                     services=simulation_services)
+        with timer.phase("teardown"):
+            docker_client.compose.down()
     logging.info(f"Simulation setup {run_name} completed")
 
 
+def execute_setup(docker_client: DockerClient,
+                  general_settings: dict[Any],
+                  simulation_setup: dict[Any],
+                  simulation_services: list[str],
+                  execution: int = 0,
+                  server: PersistentServer = None,
+                  images: Optional[dict[str, str]] = None) -> dict[str, Any]:
+    start_time = time.monotonic()
+    images = images or {}
+    result = {"setup": simulation_setup, "execution": execution,
+              "images": images, "run_name": get_run_name(simulation_setup, execution),
+              "setup_hash": get_setup_hash(simulation_setup, execution,
+                                           general_settings, simulation_services),
+              "started_at": time.time()}
+    end_report_file = get_end_report_file(general_settings["output_path"],
+                                          result["run_name"])
+    end_report_file.unlink(missing_ok=True)
+    timer = PhaseTimer(result["run_name"])
+    try:
+        simulate_setup(docker_client,
+                       general_settings,
+                       simulation_setup,
+                       simulation_services,
+                       execution,
+                       server,
+                       timer)
+        result["status"] = "completed"
+    except DockerException as e:
+        logging.error(f"Simulation setup failed: {e}")
+        result["status"] = "failed"
+        with timer.phase("teardown"):
+            if server:
+                server.stop()
+            else:
+                docker_client.compose.down()
+    result["duration"] = time.monotonic() - start_time
+    result["timings"] = timer.timings
+    result["events"] = timer.events
+    try:
+        result["events"] += get_container_events(docker_client, result["run_name"],
+                                                 result["started_at"], time.time())
+        result["timings"].update(get_container_timings(result["events"]))
+    except DockerException as e:
+        logging.warning(f"Could not read container events: {e}")
+    if end_report_file.is_file():
+        with end_report_file.open() as file:
+            end_report = json.load(file)
+        result["end_reason"] = end_report["end_reason"]
+        if "world_wait_time" in end_report:
+            result["timings"]["world_ready"] = end_report["world_wait_time"]
+    write_run_metadata(general_settings["output_path"], result)
+    return result
+
+
+def init_worker(worker_slots: multiprocessing.Queue,
+                execution_settings: dict[str, Any],
+                pinned_images_file: Path,
+                client_factory: Callable[..., DockerClient] = setup_docker_client) -> None:
+    # Every worker owns an isolated compose project with its own network
+    global _worker_docker_client, _worker_server
+    project_name = f"{COMPOSE_PROJECT_PREFIX}-{worker_slots.get()}"
+    _worker_docker_client = client_factory(
+        project_name=project_name, pinned_images_file=pinned_images_file)
+    _worker_server = setup_persistent_server(_worker_docker_client,
+                                             execution_settings)
+
+
+def execute_setup_in_worker(general_settings: dict[Any],
+                            simulation_setup: dict[Any],
+                            simulation_services: list[str],
+                            execution: int = 0,
+                            images: Optional[dict[str, str]] = None) -> dict[str, Any]:
+    return execute_setup(_worker_docker_client, general_settings,
+                         simulation_setup, simulation_services, execution,
+                         _worker_server, images)
+
+
+def convert_run(general_settings: dict[Any],
+                run_name: str,
+                convert_services: list[str],
+                pinned_images_file: Path) -> dict[str, Any]:
+    # Runs in its own process to keep the compose environment of the run isolated
+    start_time = time.monotonic()
+    os.environ.update({"run_name": run_name, **general_settings})
+    docker_client = setup_docker_client(project_name=CONVERSION_PROJECT_NAME,
+                                        pinned_images_file=pinned_images_file)
+    result = {"run_name": run_name}
+    timer = PhaseTimer(run_name)
+    try:
+        with timer.phase("conversion"):
+            for service in convert_services:
+                docker_client.compose.run(service, remove=True, tty=False,
+                                          dependencies=False)
+        result["status"] = "completed"
+    except DockerException as e:
+        logging.error(f"Conversion of {run_name} failed: {e}")
+        result["status"] = "failed"
+    result["duration"] = time.monotonic() - start_time
+    result["timings"] = timer.timings
+    result["events"] = timer.events
+    return result
+
+
+def run_setups_sequentially(docker_client: DockerClient,
+                            general_settings: dict[Any],
+                            simulation_runs: list[tuple[int, dict[Any]]],
+                            simulation_services: list[str],
+                            execution_settings: dict[str, Any],
+                            images: dict[str, str],
+                            result_callback: Callable[[dict[str, Any]], None] = None) -> list[dict[str, Any]]:
+    server = setup_persistent_server(docker_client, execution_settings)
+    results = []
+    for execution, simulation_setup in simulation_runs:
+        result = execute_setup(docker_client, general_settings, simulation_setup,
+                               simulation_services, execution, server, images)
+        if result_callback:
+            result_callback(result)
+        results.append(result)
+    if server:
+        server.stop()
+    return results
+
+
+def run_setups_in_parallel(general_settings: dict[Any],
+                           simulation_runs: list[tuple[int, dict[Any]]],
+                           simulation_services: list[str],
+                           execution_settings: dict[str, Any],
+                           images: dict[str, str],
+                           pinned_images_file: Path,
+                           result_callback: Callable[[dict[str, Any]], None] = None,
+                           client_factory: Callable[..., DockerClient] = setup_docker_client) -> list[dict[str, Any]]:
+    max_parallel_runs = execution_settings["max_parallel_runs"]
+    worker_slots = multiprocessing.Queue()
+    for slot in range(max_parallel_runs):
+        worker_slots.put(slot)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=max_parallel_runs,
+                             initializer=init_worker,
+                             initargs=(worker_slots, execution_settings,
+                                       pinned_images_file, client_factory)) as executor:
+        try:
+            futures = [executor.submit(execute_setup_in_worker, general_settings,
+                                       simulation_setup, simulation_services,
+                                       execution, images)
+                       for execution, simulation_setup in simulation_runs]
+            for future in as_completed(futures):
+                result = future.result()
+                if result_callback:
+                    result_callback(result)
+                results.append(result)
+        except KeyboardInterrupt:
+            executor.shutdown(wait=False, cancel_futures=True)
+            for slot in range(max_parallel_runs):
+                client_factory(
+                    project_name=f"{COMPOSE_PROJECT_PREFIX}-{slot}").compose.kill()
+            raise
+
+    if execution_settings["persistent_server"]:
+        # Worker processes are gone, shut down the simulators they kept running
+        for slot in range(max_parallel_runs):
+            client_factory(
+                project_name=f"{COMPOSE_PROJECT_PREFIX}-{slot}").compose.down()
+    return results
+
+
+def log_results(results: list[dict[str, Any]]) -> None:
+    failed_runs = [result for result in results if result["status"] != "completed"]
+    total_duration = sum(result["duration"] for result in results)
+    logging.info(
+        f"{len(results) - len(failed_runs)} of {len(results)} simulation runs completed "
+        f"({total_duration:.0f}s accumulated run time)")
+    for result in failed_runs:
+        logging.warning(f"Simulation run failed: {result['setup']}")
+
+
 def main():
     args = parse_arguments()
     general_settings, run_settings = load_config(Path(args.config))
-    general_settings, simulation_services, convert_services = prepare_general_settings(
+    general_settings, simulation_services, convert_services, execution_settings = prepare_general_settings(
         general_settings)
     docker_client = setup_docker_client()
+    max_parallel_runs = execution_settings["max_parallel_runs"]
 
     try:
         num_executions = int(run_settings.pop("num_executions", 1))
+        sampling = run_settings.pop("sampling", None)
 
         check_run_settings(run_settings, simulation_services)
+        check_sampling(sampling)
 
         simulation_setups = []
         for setting_key in ("permutation_settings", "scenario_settings"):
             if setting_key in run_settings:
-                keys, values = zip(*run_settings[setting_key].items())
-                setups = [dict(zip(keys, v))
-                          for v in itertools.product(*values)]
-                simulation_setups.extend(setups)
+                simulation_setups.extend(
+                    generate_setups(run_settings[setting_key], sampling))
 
         logging.info(
             f"Running {len(simulation_setups) * num_executions} different simulation setups..."
         )
 
-        for _ in range(num_executions):
-            for simulation_setup in simulation_setups:
-                try:
-                    simulate_setup(docker_client,
-                                   general_settings,
-                                   simulation_setup,
-                                   simulation_services)
-                except DockerException:
-                    docker_client.compose.down()
+        simulation_runs = [(execution, simulation_setup)
+                           for execution in range(num_executions)
+                           for simulation_setup in simulation_setups]
+
+        if execution_settings["resume"]:
+            manifest = RunManifest.for_output_path(general_settings["output_path"])
+            completed_hashes = manifest.get_completed_hashes()
+            manifest.close()
+            pending_runs = [(execution, simulation_setup)
+                            for execution, simulation_setup in simulation_runs
+                            if get_setup_hash(simulation_setup, execution, general_settings,
+                                              simulation_services) not in completed_hashes]
+            logging.info(
+                f"Skipping {len(simulation_runs) - len(pending_runs)} simulation runs "
+                f"with complete output and identical settings (except "
+                f"{', '.join(UNHASHED_GENERAL_SETTINGS)}), {len(pending_runs)} runs remaining")
+            simulation_runs = pending_runs
+
+        if execution_settings["reorder_setups"]:
+            map_switches_before = count_map_switches(simulation_runs)
+            simulation_runs = schedule_setups(simulation_runs)
+            logging.info(
+                f"Reordered simulation setups by {', '.join(SCHEDULING_KEYS)}: "
+                f"{count_map_switches(simulation_runs)} expected map switches "
+                f"instead of {map_switches_before}")
+        else:
+            logging.info(
+                f"{count_map_switches(simulation_runs)} expected map switches")
+
+        # Resolve images once, every run uses the same pinned image digests
+        image_services = simulation_services + (convert_services or [])
+        if execution_settings["persistent_server"]:
+            image_services.append(WORLD_RESET_SERVICE)
+        sweep_timer = PhaseTimer()
+        with sweep_timer.phase("image_pull" if execution_settings["pull_images"] else "image_resolve"):
+            images = resolve_images(docker_client, general_settings,
+                                    image_services, execution_settings["pull_images"])
+        write_trace_events(general_settings["output_path"], sweep_timer.events)
+        pinned_images_file = write_pinned_images_file(
+            images, general_settings["output_path"])
+        docker_client = setup_docker_client(
+            pinned_images_file=pinned_images_file)
+
+        # Convert finished runs in the background while the next runs are simulated
+        conversion_executor = None
+        conversion_futures = []
+        if convert_services:
+            conversion_executor = ProcessPoolExecutor(
+                max_workers=execution_settings["max_parallel_conversions"])
+
+        # Every finished run is registered by the main process only
+        manifest = RunManifest.for_output_path(general_settings["output_path"])
+
+        def handle_result(result: dict[str, Any]) -> None:
+            manifest.register(result, general_settings["output_path"])
+            write_trace_events(general_settings["output_path"], result["events"])
+            if conversion_executor and result["status"] == "completed":
+                logging.info(
+                    f"Converting simulation run {result['run_name']} in the background...")
+                conversion_futures.append(conversion_executor.submit(
+                    convert_run, general_settings, result["run_name"],
+                    convert_services, pinned_images_file))
+
+        if max_parallel_runs > 1:
+            logging.info(
+                f"Running up to {max_parallel_runs} simulation setups in parallel...")
+            results = run_setups_in_parallel(general_settings,
+                                             simulation_runs,
+                                             simulation_services,
+                                             execution_settings,
+                                             images,
+                                             pinned_images_file,
+                                             handle_result)
+        else:
+            results = run_setups_sequentially(docker_client,
+                                              general_settings,
+                                              simulation_runs,
+                                              simulation_services,
+                                              execution_settings,
+                                              images,
+                                              handle_result)
+        manifest.close()
+        log_results(results)
+        conversion_results = []
+
+        if conversion_executor:
+            logging.info("Waiting for remaining conversions...")
+            conversion_results = [future.result() for future in conversion_futures]
+            conversion_executor.shutdown()
+            failed_conversions = [result["run_name"] for result in conversion_results
+                                  if result["status"] != "completed"]
+            logging.info(
+                f"{len(conversion_results) - len(failed_conversions)} of "
+                f"{len(conversion_results)} simulation runs converted")
+            for run_name in failed_conversions:
+                logging.warning(f"Conversion failed: {run_name}")
+            for result in conversion_results:
+                write_trace_events(general_settings["output_path"], result["events"])
+
+        log_phase_summary(results + conversion_results, sweep_timer.timings)
+        logging.info(
+            f"Timing trace written to {Path(general_settings['output_path']) / TRACE_FILE}")
 
     except KeyboardInterrupt:
         docker_client.compose.kill()
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Any
+
+import yaml
+
+MANIFEST_FILE = "manifest.sqlite"
+# Suffix which the recorder appends to the run name of a bag
+BAG_SUFFIX_PATTERN = re.compile(r"_\d{4}-\d{2}-\d{2}-\d{2}-\d{2}")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_name TEXT PRIMARY KEY,
+    setup_hash TEXT,
+    execution INTEGER,
+    status TEXT,
+    end_reason TEXT,
+    started_at REAL,
+    duration REAL,
+    setup TEXT,
+    images TEXT,
+    timings TEXT,
+    bag_path TEXT,
+    bag_size INTEGER,
+    message_count INTEGER,
+    topics TEXT
+);
+CREATE TABLE IF NOT EXISTS parameters (
+    run_name TEXT REFERENCES runs(run_name) ON DELETE CASCADE,
+    key TEXT,
+    value TEXT,
+    PRIMARY KEY (run_name, key)
+);
+CREATE INDEX IF NOT EXISTS parameters_key_value ON parameters(key, value);
+CREATE INDEX IF NOT EXISTS runs_status ON runs(status);
+"""
+
+# Columns added after the first schema version, created in existing manifests on open
+MIGRATED_COLUMNS = {"setup_hash": "TEXT", "end_reason": "TEXT"}
+
+JSON_COLUMNS = ("setup", "images", "timings", "topics")
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def find_bag(output_path: str, run_name: str) -> Path:
+    # The recorder appends the start time to the run name, the latest finished bag wins
+    bags = sorted(path for path in (Path(output_path) / "bags").glob(f"{run_name}_*")
+                  if (path / "metadata.yaml").is_file()
+                  and BAG_SUFFIX_PATTERN.fullmatch(path.name[len(run_name):]))
+    return bags[-1] if bags else None
+
+
+def read_bag_info(bag_path: Path) -> dict[str, Any]:
+    with (bag_path / "metadata.yaml").open() as file:
+        metadata = yaml.safe_load(file)["rosbag2_bagfile_information"]
+    topics = {
+        topic["topic_metadata"]["name"]: {
+            "type": topic["topic_metadata"]["type"],
+            "message_count": topic["message_count"],
+        }
+        for topic in metadata.get("topics_with_message_count", [])
+    }
+    return {
+        "bag_path": str(bag_path),
+        "bag_size": sum(file.stat().st_size for file in bag_path.iterdir()
+                        if file.is_file()),
+        "message_count": metadata.get("message_count", 0),
+        "topics": topics,
+    }
+
+
+class RunManifest:
+    """SQLite index of all simulation runs written to an output path."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path).resolve()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+        columns = [row["name"] for row in self.connection.execute("PRAGMA table_info(runs)")]
+        for column, column_type in MIGRATED_COLUMNS.items():
+            if column not in columns:
+                self.connection.execute(f"ALTER TABLE runs ADD COLUMN {column} {column_type}")
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS runs_setup_hash ON runs(setup_hash)")
+
+    @classmethod
+    def for_output_path(cls, output_path: str) -> "RunManifest":
+        return cls(Path(output_path) / MANIFEST_FILE)
+
+    def register(self, result: dict[str, Any], output_path: str) -> None:
+        run = {
+            "run_name": result["run_name"],
+            "setup_hash": result.get("setup_hash"),
+            "execution": result.get("execution", 0),
+            "status": result["status"],
+            "end_reason": result.get("end_reason"),
+            "started_at": result.get("started_at"),
+            "duration": result.get("duration"),
+            "setup": result.get("setup", {}),
+            "images": result.get("images", {}),
+            "timings": result.get("timings", {}),
+            "bag_path": None,
+            "bag_size": None,
+            "message_count": None,
+            "topics": {},
+        }
+        bag_path = find_bag(output_path, result["run_name"])
+        if bag_path:
+            try:
+                run.update(read_bag_info(bag_path))
+            except (OSError, KeyError, yaml.YAMLError) as e:
+                logging.warning(f"Could not read bag metadata of {bag_path}: {e}")
+            # Relative to the manifest, so the output path can be moved or read from anywhere
+            run["bag_path"] = os.path.relpath(bag_path.resolve(), self.path.parent.resolve())
+
+        for column in JSON_COLUMNS:
+            run[column] = json.dumps(run[column])
+        with self.connection:
+            self.connection.execute(
+                f"INSERT OR REPLACE INTO runs ({', '.join(run)}) "
+                f"VALUES ({', '.join('?' * len(run))})", list(run.values()))
+            self.connection.execute(
+                "DELETE FROM parameters WHERE run_name = ?", (result["run_name"],))
+            self.connection.executemany(
+                "INSERT INTO parameters (run_name, key, value) VALUES (?, ?, ?)",
+                [(result["run_name"], key, str(value))
+                 for key, value in result.get("setup", {}).items()])
+
+    def get_completed_hashes(self) -> set[str]:
+        """Returns the setup hashes of completed runs whose bag is still complete on disk."""
+        completed_hashes = set()
+        for row in self.connection.execute(
+                "SELECT setup_hash, bag_path, message_count FROM runs "
+                "WHERE status = 'completed' AND setup_hash IS NOT NULL"):
+            if row["bag_path"] and row["message_count"] and \
+                    (self.resolve_bag_path(row["bag_path"]) / "metadata.yaml").is_file():
+                completed_hashes.add(row["setup_hash"])
+        return completed_hashes
+
+    def resolve_bag_path(self, bag_path: str) -> Path:
+        return self.path.parent / bag_path
+
+    def _where(self, status: str = None, parameters: dict[str, str] = None) -> tuple[str, list[Any]]:
+        clauses, values = [], []
+        if status:
+            clauses.append("runs.status = ?")
+            values.append(status)
+        for key, value in (parameters or {}).items():
+            clauses.append(
+                "runs.run_name IN (SELECT run_name FROM parameters WHERE key = ? AND value = ?)")
+            values.extend([key, str(value)])
+        return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), values
+
+    def query(self,
+              status: str = None,
+              parameters: dict[str, str] = None,
+              limit: int = None) -> list[dict[str, Any]]:
+        """Returns all runs with the given status and setup parameter values."""
+        where, values = self._where(status, parameters)
+        sql = f"SELECT * FROM runs {where} ORDER BY started_at"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        runs = []
+        for row in self.connection.execute(sql, values):
+            run = dict(row)
+            for column in JSON_COLUMNS:
+                run[column] = json.loads(run[column]) if run[column] else {}
+            if run["bag_path"]:
+                run["bag_path"] = str(self.resolve_bag_path(run["bag_path"]))
+            runs.append(run)
+        return runs
+
+    def aggregate(self,
+                  group_by: str,
+                  status: str = None,
+                  parameters: dict[str, str] = None) -> list[dict[str, Any]]:
+        """Returns run counts, durations and data sizes per value of a setup parameter."""
+        where, values = self._where(status, parameters)
+        sql = f"""
+            SELECT grouping.value AS {quote_identifier(group_by)},
+                   COUNT(*) AS runs,
+                   SUM(runs.status = 'completed') AS completed,
+                   SUM(runs.status != 'completed') AS failed,
+                   AVG(runs.duration) AS avg_duration,
+                   SUM(runs.message_count) AS message_count,
+                   SUM(runs.bag_size) AS bag_size
+            FROM runs
+            JOIN parameters AS grouping
+                ON grouping.run_name = runs.run_name AND grouping.key = ?
+            {where}
+            GROUP BY grouping.value
+            ORDER BY grouping.value"""
+        return [dict(row) for row in self.connection.execute(sql, [group_by, *values])]
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Query the run manifest of a data generation output path")
+    parser.add_argument(
+        'output_path',
+        help='Output path of the data generation or path of the manifest file')
+    parser.add_argument('--status', choices=['completed', 'failed'],
+                        help='Only show runs with this status')
+    parser.add_argument('--filter', metavar='KEY=VALUE', action='append', default=[],
+                        help='Only show runs with this setup parameter value, can be repeated')
+    parser.add_argument('--group-by', metavar='KEY',
+                        help='Aggregate runs per value of this setup parameter')
+    parser.add_argument('--limit', type=int, help='Maximum number of listed runs')
+    parser.add_argument('--json', action='store_true',
+                        help='Print full entries as JSON')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    manifest_path = Path(args.output_path)
+    if manifest_path.is_dir():
+        manifest_path = manifest_path / MANIFEST_FILE
+    if not manifest_path.is_file():
+        logging.error(f"Run manifest not found: {manifest_path}")
+        return 1
+
+    parameters = {}
+    for item in args.filter:
+        key, separator, value = item.partition("=")
+        if not separator:
+            logging.error(f"Invalid filter, expected KEY=VALUE: {item}")
+            return 1
+        parameters[key] = value
+
+    manifest = RunManifest(manifest_path)
+    if args.group_by:
+        entries = manifest.aggregate(args.group_by, args.status, parameters)
+    else:
+        entries = manifest.query(args.status, parameters, args.limit)
+    manifest.close()
+
+    if args.json:
+        print(json.dumps(entries, indent=2))
+    elif args.group_by:
+        for entry in entries:
+            print(f"{entry[args.group_by]}: {entry['completed']}/{entry['runs']} completed, "
+                  f"{entry['avg_duration'] or 0:.0f}s avg duration, "
+                  f"{entry['message_count'] or 0} messages, {entry['bag_size'] or 0} bytes")
+    else:
+        for entry in entries:
+            print(f"{entry['run_name']}: {entry['status']} ({entry['end_reason'] or '-'}), "
+                  f"{entry['duration'] or 0:.0f}s, "
+                  f"{entry['message_count'] or 0} messages, {entry['bag_size'] or 0} bytes, "
+                  f"{entry['bag_path'] or 'no bag'}")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
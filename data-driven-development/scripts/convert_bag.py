@@ -0,0 +1,221 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from frame_store import FrameStoreWriter
+from sample_sync import DEFAULT_TOLERANCE, find_bag, open_bag, synchronized_samples
+
+# CARLA 0.9.15 semantic tags in the order of their CityScapes palette colors (r, g, b)
+CITYSCAPES_PALETTE = [
+    (0, 0, 0),        # 0 unlabeled
+    (128, 64, 128),   # 1 road
+    (244, 35, 232),   # 2 sidewalk
+    (70, 70, 70),     # 3 building
+    (102, 102, 156),  # 4 wall
+    (190, 153, 153),  # 5 fence
+    (153, 153, 153),  # 6 pole
+    (250, 170, 30),   # 7 traffic light
+    (220, 220, 0),    # 8 traffic sign
+    (107, 142, 35),   # 9 vegetation
+    (152, 251, 152),  # 10 terrain
+    (70, 130, 180),   # 11 sky
+    (220, 20, 60),    # 12 pedestrian
+    (255, 0, 0),      # 13 rider
+    (0, 0, 142),      # 14 car
+    (0, 0, 70),       # 15 truck
+    (0, 60, 100),     # 16 bus
+    (0, 80, 100),     # 17 train
+    (0, 0, 230),      # 18 motorcycle
+    (119, 11, 32),    # 19 bicycle
+    (110, 190, 160),  # 20 static
+    (170, 120, 50),   # 21 dynamic
+    (55, 90, 80),     # 22 other
+    (45, 60, 150),    # 23 water
+    (157, 234, 50),   # 24 road line
+    (81, 0, 81),      # 25 ground
+    (150, 100, 100),  # 26 bridge
+    (230, 150, 140),  # 27 rail track
+    (180, 165, 180),  # 28 guard rail
+]
+PALETTE_KEYS = np.array([r << 16 | g << 8 | b for r, g, b in CITYSCAPES_PALETTE])
+PALETTE_ORDER = np.argsort(PALETTE_KEYS)
+
+IMAGE_TYPE = "sensor_msgs/msg/Image"
+
+# colors outside of the palette are only reported once per process
+unknown_colors_reported = False
+
+
+def image_to_array(msg):
+    channels = len(msg.data) // (msg.height * msg.width)
+    image = np.frombuffer(msg.data, dtype=np.uint8).reshape(
+        msg.height, msg.width, channels)
+    if msg.encoding.startswith("bgr"):
+        image = image[..., 2::-1]
+    return np.ascontiguousarray(image[..., :3])
+
+
+def colors_to_labels(image):
+    keys = (image[..., 0].astype(np.int64) << 16 |
+            image[..., 1].astype(np.int64) << 8 | image[..., 2])
+    positions = np.searchsorted(PALETTE_KEYS[PALETTE_ORDER], keys)
+    positions = np.clip(positions, 0, len(PALETTE_KEYS) - 1)
+    labels = PALETTE_ORDER[positions]
+    # colors which are not part of the palette are unlabeled
+    unknown = PALETTE_KEYS[labels] != keys
+    if unknown.any():
+        global unknown_colors_reported
+        if not unknown_colors_reported:
+            colors = np.unique(keys[unknown])[:5]
+            print("Warning: {} pixels with colors outside of the semantic palette are unlabeled, "
+                  "e.g. {}".format(int(unknown.sum()),
+                                   [(c >> 16, c >> 8 & 255, c & 255) for c in colors.tolist()]))
+            unknown_colors_reported = True
+        labels[unknown] = 0
+    return labels.astype(np.uint8)
+
+
+def decode_frame(raw_rgb, raw_segmentation):
+    # runs in a worker process, deserialization happens there as well
+    from rclpy.serialization import deserialize_message
+    from rosidl_runtime_py.utilities import get_message
+
+    image_type = get_message(IMAGE_TYPE)
+    rgb = image_to_array(deserialize_message(raw_rgb, image_type))
+    segmentation = colors_to_labels(
+        image_to_array(deserialize_message(raw_segmentation, image_type)))
+    return rgb, segmentation
+
+
+def write_shard(output_path, index, timestamps, frames, poses):
+    shard_file = os.path.join(output_path, "shard-{:05d}.npz".format(index))
+    np.savez(shard_file,
+             timestamps=np.array(timestamps, dtype=np.float64),
+             rgb=np.stack([rgb for rgb, _ in frames]),
+             segmentation=np.stack([segmentation for _, segmentation in frames]),
+             poses=np.array(poses, dtype=np.float64))
+    print("Wrote {} frames to {}".format(len(timestamps), shard_file))
+
+
+def read_metadata(metadata_file):
+    metadata = dict()
+    if metadata_file and os.path.isfile(metadata_file):
+        with open(metadata_file) as file:
+            result = json.load(file)
+        metadata = {"run_name": result.get("run_name"),
+                    "simulation_setup": result.get("setup", dict())}
+    return metadata
+
+
+def convert(args):
+    bag_path = find_bag(args.bag)
+    os.makedirs(args.output, exist_ok=True)
+    reader = open_bag(bag_path,
+                      [args.rgb_topic, args.segmentation_topic, args.tf_topic])
+    print("Converting {} to {} ...".format(bag_path, args.output))
+
+    writer = None
+    if args.format == "frame_store":
+        metadata = read_metadata(args.metadata)
+        metadata["bag"] = os.path.basename(bag_path)
+        writer = FrameStoreWriter(args.output, args.shard_size, metadata)
+
+    shard_index = 0
+    shard = []
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+
+        def flush_shard(shard_index, shard):
+            frames = executor.map(decode_frame, [x[1] for x in shard],
+                                  [x[2] for x in shard])
+            if writer is None:
+                write_shard(args.output, shard_index, [x[0] for x in shard],
+                            list(frames), [x[3] for x in shard])
+                return
+            for (stamp, _, _, pose), (rgb, segmentation) in zip(shard, frames):
+                writer.append(stamp, {"rgb": rgb, "segmentation": segmentation}, pose)
+
+        # only one shard of raw messages is kept in memory
+        samples = synchronized_samples(reader,
+                                       [args.rgb_topic, args.segmentation_topic],
+                                       args.tf_topic,
+                                       args.ego_frame,
+                                       args.tolerance)
+        for stamp, (raw_rgb, raw_segmentation), pose in samples:
+            shard.append((stamp, raw_rgb, raw_segmentation, pose))
+            if len(shard) == args.shard_size:
+                flush_shard(shard_index, shard)
+                shard_index += 1
+                shard = []
+        if shard:
+            flush_shard(shard_index, shard)
+            shard_index += 1
+
+    if writer is not None:
+        writer.close()
+        print("Converted {} into a frame store of {} frames.".format(
+            bag_path, len(writer.timestamps)))
+    else:
+        print("Converted {} into {} shards.".format(bag_path, shard_index))
+    return 0
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument('--bag',
+                           metavar='B',
+                           required=True,
+                           help='Path or glob pattern of the bag, the latest match is used')
+    argparser.add_argument('--output',
+                           metavar='O',
+                           required=True,
+                           help='Directory of the dataset')
+    argparser.add_argument('--format',
+                           default='frame_store',
+                           choices=['frame_store', 'npz'],
+                           help='Memory-mappable frame store or compressed npz shards (default: frame_store)')
+    argparser.add_argument('--metadata',
+                           metavar='M',
+                           default=None,
+                           help='Run metadata file of data_generation.py, its simulation setup is stored with the frame store')
+    argparser.add_argument('--rgb_topic',
+                           metavar='T',
+                           default='/carla/ego_vehicle/rgb/image',
+                           help='RGB image topic')
+    argparser.add_argument('--segmentation_topic',
+                           metavar='T',
+                           default='/carla/ego_vehicle/segmentation/image',
+                           help='Semantic segmentation image topic')
+    argparser.add_argument('--tf_topic',
+                           metavar='T',
+                           default='/tf',
+                           help='Transform topic')
+    argparser.add_argument('--ego_frame',
+                           metavar='F',
+                           default='ego_vehicle',
+                           help='Frame of the ego vehicle in the transform tree')
+    argparser.add_argument('--tolerance',
+                           metavar='S',
+                           default=DEFAULT_TOLERANCE,
+                           type=float,
+                           help='Maximum stamp difference in seconds of images in one frame (default: {})'.format(DEFAULT_TOLERANCE))
+    argparser.add_argument('--shard_size',
+                           metavar='N',
+                           default=100,
+                           type=int,
+                           help='Number of frames per shard or frame store chunk (default: 100)')
+    argparser.add_argument('--workers',
+                           metavar='W',
+                           default=None,
+                           type=int,
+                           help='Number of image decoding processes (default: number of CPUs)')
+
+    args = argparser.parse_args()
+    return convert(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,183 @@
+import json
+import os
+
+import numpy as np
+
+SIDECAR_FILE = "frame_store.json"
+TIMESTAMPS_FILE = "timestamps.npy"
+POSES_FILE = "poses.npy"
+FORMAT_VERSION = 1
+
+
+def chunk_path(path, sensor, chunk_index):
+    return os.path.join(path, sensor, "chunk-{:05d}.npy".format(chunk_index))
+
+
+class FrameStoreWriter(object):
+    """
+    Writes frames into fixed-shape, memory-mappable chunks per sensor
+
+    Every sensor is stored as .npy chunks of chunk_size frames, the last chunk
+    is only filled partially. The sim-time index, the ego poses and the json
+    sidecar are written on close, so a store with sidecar is always complete.
+
+    :param path: Directory of the frame store
+    :param chunk_size: Number of frames per chunk
+    :param metadata: Dict stored in the sidecar, e.g. the simulation setup of the run
+    """
+
+    def __init__(self, path, chunk_size=100, metadata=None):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.metadata = metadata or dict()
+        self.sensors = dict()
+        self.chunks = dict()
+        self.timestamps = []
+        self.poses = []
+        os.makedirs(path, exist_ok=True)
+
+    def append(self, timestamp, frames, pose=None):
+        """
+        Function to append one frame of all sensors
+
+        :param timestamp: Simulation time of the frame in seconds
+        :param frames: Dict of sensor name and array, shapes must not change
+        :param pose: Ego pose [x, y, z, qx, qy, qz, qw]
+        """
+        index = len(self.timestamps)
+        chunk_index, offset = divmod(index, self.chunk_size)
+        for sensor, frame in frames.items():
+            frame = np.asarray(frame)
+            layout = {"shape": list(frame.shape), "dtype": frame.dtype.str}
+            if self.sensors.setdefault(sensor, layout) != layout:
+                raise ValueError("Frame {} of {} has layout {}, expected {}".format(
+                    index, sensor, layout, self.sensors[sensor]))
+            if offset == 0:
+                self.open_chunk(sensor, chunk_index, frame)
+            self.chunks[sensor][offset] = frame
+        self.timestamps.append(timestamp)
+        self.poses.append(pose if pose is not None else [np.nan] * 7)
+
+    def open_chunk(self, sensor, chunk_index, frame):
+        if sensor in self.chunks:
+            self.chunks[sensor].flush()
+        os.makedirs(os.path.join(self.path, sensor), exist_ok=True)
+        self.chunks[sensor] = np.lib.format.open_memmap(
+            chunk_path(self.path, sensor, chunk_index), mode="w+",
+            dtype=frame.dtype, shape=(self.chunk_size,) + frame.shape)
+
+    def close(self):
+        for chunk in self.chunks.values():
+            chunk.flush()
+        self.chunks = dict()
+
+        np.save(os.path.join(self.path, TIMESTAMPS_FILE),
+                np.array(self.timestamps, dtype=np.float64))
+        np.save(os.path.join(self.path, POSES_FILE),
+                np.array(self.poses, dtype=np.float64).reshape(-1, 7))
+        sidecar = {
+            "version": FORMAT_VERSION,
+            "num_frames": len(self.timestamps),
+            "chunk_size": self.chunk_size,
+            "sensors": self.sensors,
+            "metadata": self.metadata,
+        }
+        tmp_path = os.path.join(self.path, SIDECAR_FILE + ".tmp")
+        with open(tmp_path, "w") as file:
+            json.dump(sidecar, file, indent=2)
+        os.replace(tmp_path, os.path.join(self.path, SIDECAR_FILE))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+
+class FrameStore(object):
+    """
+    Random access reader of a frame store
+
+    Frames are returned as read-only views of memory-mapped chunks, nothing is
+    deserialized or copied until the data is used.
+
+    :param path: Directory of the frame store
+    """
+
+    def __init__(self, path):
+        self.path = path
+        sidecar_path = os.path.join(path, SIDECAR_FILE)
+        if not os.path.isfile(sidecar_path):
+            raise RuntimeError("No complete frame store found at {}".format(path))
+        with open(sidecar_path) as file:
+            sidecar = json.load(file)
+        if sidecar["version"] != FORMAT_VERSION:
+            raise RuntimeError("Unsupported frame store version {}".format(
+                sidecar["version"]))
+
+        self.num_frames = sidecar["num_frames"]
+        self.chunk_size = sidecar["chunk_size"]
+        self.sensors = sidecar["sensors"]
+        self.metadata = sidecar["metadata"]
+        self.timestamps = np.load(os.path.join(path, TIMESTAMPS_FILE), mmap_mode="r")
+        self.poses = np.load(os.path.join(path, POSES_FILE), mmap_mode="r")
+        self.chunks = dict()
+
+    def __len__(self):
+        return self.num_frames
+
+    def __getitem__(self, index):
+        """
+        Function to get one frame of all sensors
+
+        :return: Dict with timestamp, pose and one array per sensor
+        """
+        index = self.check_index(index)
+        frame = {"timestamp": float(self.timestamps[index]), "pose": self.poses[index]}
+        for sensor in self.sensors:
+            frame[sensor] = self.get(sensor, index)
+        return frame
+
+    def __iter__(self):
+        for index in range(self.num_frames):
+            yield self[index]
+
+    def check_index(self, index):
+        if index < 0:
+            index += self.num_frames
+        if not 0 <= index < self.num_frames:
+            raise IndexError("Frame {} out of range of {} frames".format(
+                index, self.num_frames))
+        return index
+
+    def get(self, sensor, index):
+        """
+        Function to get the frame of a single sensor
+
+        :param sensor: Sensor name as listed in sensors
+        :param index: Frame index
+        :return: Read-only array
+        """
+        chunk_index, offset = divmod(self.check_index(index), self.chunk_size)
+        key = (sensor, chunk_index)
+        if key not in self.chunks:
+            self.chunks[key] = np.load(chunk_path(self.path, sensor, chunk_index),
+                                       mmap_mode="r")
+        return self.chunks[key][offset]
+
+    def find(self, simulation_time):
+        """
+        Function to find the frame closest to a simulation time
+
+        :param simulation_time: Simulation time in seconds
+        :return: Frame index
+        """
+        if self.num_frames == 0:
+            raise IndexError("Frame store is empty")
+        index = int(np.searchsorted(self.timestamps, simulation_time))
+        if index == self.num_frames or (
+                index > 0 and simulation_time - self.timestamps[index - 1] <
+                self.timestamps[index] - simulation_time):
+            index -= 1
+        return index
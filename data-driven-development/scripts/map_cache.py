@@ -0,0 +1,143 @@
+import json
+import os
+
+import carla
+from numpy import random
+
+# Number of cached navigation locations, which is larger than the usual walker request
+NAVIGATION_POOL_SIZE = 2000
+
+
+class MapCache(object):
+    """
+    Persistent cache of static map data for one town and CARLA version
+
+    Spawn points, sampled navigation locations and a summary of the OpenDRIVE
+    topology never change for a given town, so they are only requested from
+    the server once and stored as json file in the cache directory.
+
+    :param cache_dir: Directory of the cache files
+    :param town: Name of the loaded town
+    :param version: CARLA server version
+    """
+
+    def __init__(self, cache_dir, town, version):
+        self.path = os.path.join(cache_dir, "{}_{}.json".format(
+            town.replace("/", "_"), version))
+        self.data = dict()
+        if os.path.exists(self.path):
+            with open(self.path, "r") as file:
+                self.data = json.load(file)
+
+    @classmethod
+    def from_client(cls, client, cache_dir, town):
+        """
+        Function to create the cache for the connected server, if the cache directory exists
+
+        :return: MapCache object or None
+        """
+        if not cache_dir or not town or not os.path.isdir(cache_dir):
+            return None
+        return cls(cache_dir, town, client.get_server_version())
+
+    def save(self):
+        # write to a temporary file first as parallel runs may share the cache
+        tmp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(tmp_path, "w") as file:
+            json.dump(self.data, file)
+        os.replace(tmp_path, self.path)
+
+    def load_map_data(self, world):
+        carla_map = world.get_map()
+        topology = carla_map.get_topology()
+        waypoints = [waypoint for edge in topology for waypoint in edge]
+
+        self.data["spawn_points"] = [[
+            x.location.x, x.location.y, x.location.z,
+            x.rotation.pitch, x.rotation.yaw, x.rotation.roll
+        ] for x in carla_map.get_spawn_points()]
+        self.data["topology"] = {
+            "map_name": carla_map.name,
+            "edges": len(topology),
+            "roads": len(set(x.road_id for x in waypoints)),
+            "junctions": len(set(x.junction_id for x in waypoints if x.is_junction)),
+        }
+        self.save()
+
+    def get_spawn_points(self, world):
+        """
+        Function to get the spawn points of the map in server order
+
+        :param world: Carla world object
+        :return: List of transforms
+        """
+        if "spawn_points" not in self.data:
+            self.load_map_data(world)
+        return [
+            carla.Transform(carla.Location(x, y, z),
+                            carla.Rotation(pitch, yaw, roll))
+            for x, y, z, pitch, yaw, roll in self.data["spawn_points"]
+        ]
+
+    def get_topology(self, world):
+        """
+        Function to get the summary of the OpenDRIVE topology
+
+        :param world: Carla world object
+        :return: Dict with map name and number of edges, roads and junctions
+        """
+        if "topology" not in self.data:
+            self.load_map_data(world)
+        return self.data["topology"]
+
+    def get_navigation_locations(self, world, number):
+        """
+        Function to draw random locations of the navigation mesh
+
+        Locations are drawn with the seeded random generator from a pool of
+        cached locations. The pool is filled to a fixed size independent of the
+        request, so the drawn locations do not depend on earlier runs.
+
+        :param world: Carla world object
+        :param number: Number of locations
+        :return: List of locations and number of server round trips
+        """
+        pool = [carla.Location(*x) for x in self.data.get("navigation_locations", [])]
+        pool_size = max(NAVIGATION_POOL_SIZE, number)
+        round_trips = 0
+        # a pool which stayed short after all attempts is not sampled again for the same size
+        if len(pool) < pool_size and self.data.get("navigation_pool_size", 0) < pool_size:
+            locations, round_trips = sample_navigation_locations(world, pool_size - len(pool))
+            pool += locations
+            if len(pool) < pool_size:
+                print("Found only {} of {} navigation locations".format(len(pool), pool_size))
+            self.data["navigation_locations"] = [[loc.x, loc.y, loc.z] for loc in pool]
+            self.data["navigation_pool_size"] = pool_size
+            self.save()
+
+        indices = random.choice(len(pool), min(number, len(pool)), replace=False)
+        return [pool[i] for i in indices], round_trips
+
+
+def sample_navigation_locations(world, number, max_attempts=None):
+    """
+    Function to sample random locations of the navigation mesh from the server
+
+    The server returns no location if it fails to find one, so it is asked
+    until enough locations are found, but at most max_attempts times.
+
+    :param world: Carla world object
+    :param number: Number of locations
+    :param max_attempts: Maximum number of requests (default: twice the number)
+    :return: List of locations and number of server round trips
+    """
+    if max_attempts is None:
+        max_attempts = 2 * number
+    locations = []
+    round_trips = 0
+    while len(locations) < number and round_trips < max_attempts:
+        loc = world.get_random_location_from_navigation()
+        round_trips += 1
+        if loc is not None:
+            locations.append(loc)
+    return locations, round_trips
@@ -0,0 +1,72 @@
+import sys
+import glob
+import os
+import argparse
+
+try:
+    sys.path.append(
+        glob.glob('../carla/dist/carla-*%d.%d-%s.egg' %
+                  (sys.version_info.major, sys.version_info.minor,
+                   'win-amd64' if os.name == 'nt' else 'linux-x86_64'))[0])
+except IndexError:
+    pass
+
+import carla
+
+# Actors which are left behind by the per-run services of a simulation setup
+ACTOR_FILTERS = ['controller.*', 'sensor.*', 'vehicle.*', 'walker.*']
+
+
+def cleanup_world(client, world):
+    # stop walker controllers before their walkers are destroyed
+    for controller in world.get_actors().filter('controller.ai.walker'):
+        controller.stop()
+
+    actor_ids = []
+    for actor_filter in ACTOR_FILTERS:
+        actor_ids.extend(
+            actor.id for actor in world.get_actors().filter(actor_filter))
+    client.apply_batch_sync(
+        [carla.command.DestroyActor(actor_id) for actor_id in actor_ids])
+    print("Destroyed {} actors.".format(len(actor_ids)))
+
+    # leave synchronous mode, the client which ticked the world is gone
+    settings = world.get_settings()
+    settings.synchronous_mode = False
+    settings.fixed_delta_seconds = None
+    world.apply_settings(settings)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument(
+        '--host',
+        metavar='H',
+        default='carla-server',
+        help='IP of the host server (default: carla-server)')
+    argparser.add_argument(
+        '--mode',
+        metavar='M',
+        default='cleanup',
+        choices=['reload', 'cleanup'],
+        help='Reload the current map or only destroy leftover actors (default: cleanup)')
+
+    args = argparser.parse_args()
+
+    client = carla.Client(args.host, 2000)
+    client.set_timeout(60.0)
+
+    if args.mode == 'reload':
+        # reloading the map removes all actors and restores the default settings
+        world = client.reload_world()
+        print("World reloaded.")
+    else:
+        world = client.get_world()
+        cleanup_world(client, world)
+
+    world.wait_for_tick()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,270 @@
+import bisect
+import collections
+import glob
+import os
+import struct
+
+import numpy as np
+import yaml
+
+TF_TYPE = "tf2_msgs/msg/TFMessage"
+
+# Default maximum stamp difference in seconds of messages in one sample
+DEFAULT_TOLERANCE = 0.005
+# Default maximum number of buffered messages per topic
+DEFAULT_QUEUE_SIZE = 100
+
+
+def find_bag(bag_pattern):
+    bags = sorted(path for path in glob.glob(bag_pattern)
+                  if os.path.isfile(os.path.join(path, "metadata.yaml")))
+    if not bags:
+        raise RuntimeError("No finished bag found for {}".format(bag_pattern))
+    return bags[-1]
+
+
+def open_bag(bag_path, topics):
+    # ROS is only imported for reading bags, the synchronization itself does not depend on it
+    import rosbag2_py
+
+    with open(os.path.join(bag_path, "metadata.yaml")) as file:
+        metadata = yaml.safe_load(file)["rosbag2_bagfile_information"]
+
+    reader = rosbag2_py.SequentialReader()
+    reader.open(
+        rosbag2_py.StorageOptions(uri=bag_path,
+                                  storage_id=metadata["storage_identifier"]),
+        rosbag2_py.ConverterOptions("cdr", "cdr"))
+    reader.set_filter(rosbag2_py.StorageFilter(topics=topics))
+    return reader
+
+
+def read_stamp(data):
+    """
+    Function to read the header stamp of a serialized message without deserializing it
+
+    The CDR encapsulation header is followed by the std_msgs/Header stamp.
+
+    :param data: CDR serialized message starting with a std_msgs/Header
+    :return: Stamp in seconds
+    """
+    byte_order = "<" if data[1] == 1 else ">"
+    sec, nanosec = struct.unpack_from(byte_order + "iI", data, 4)
+    return sec + nanosec * 1e-9
+
+
+def slerp(q0, q1, t):
+    q0 = np.asarray(q0, dtype=np.float64)
+    q1 = np.asarray(q1, dtype=np.float64)
+    dot = np.dot(q0, q1)
+    # take the shorter path
+    if dot < 0.0:
+        q1 = -q1
+        dot = -dot
+    if dot > 0.9995:
+        q = q0 + t * (q1 - q0)
+        return q / np.linalg.norm(q)
+    theta = np.arccos(dot)
+    return (np.sin((1.0 - t) * theta) * q0 + np.sin(t * theta) * q1) / np.sin(theta)
+
+
+class SampleSynchronizer(object):
+    """
+    Streaming join of N topics by header stamp
+
+    Each message of the first topic is the reference of one sample. It is
+    matched with the message of every other topic closest to its stamp, as
+    soon as that message is known to be the closest one. References without
+    a match within the tolerance are dropped. Every topic buffers at most
+    queue_size messages, the oldest messages are dropped first.
+
+    :param topics: List of topics, the first one is the reference topic
+    :param tolerance: Maximum stamp difference in seconds to the reference message
+    :param queue_size: Maximum number of buffered messages per topic
+    """
+
+    def __init__(self, topics, tolerance=DEFAULT_TOLERANCE, queue_size=DEFAULT_QUEUE_SIZE):
+        self.topics = list(topics)
+        self.tolerance = tolerance
+        self.queues = {topic: collections.deque(maxlen=queue_size)
+                       for topic in self.topics}
+        self.matched = 0
+        self.dropped = 0
+
+    def add(self, topic, stamp, data):
+        """
+        Function to add a message and collect all samples which are complete afterwards
+
+        :return: List of tuples of reference stamp and list of messages in topic order
+        """
+        queue = self.queues[topic]
+        if len(queue) == queue.maxlen:
+            self.dropped += 1
+        queue.append((stamp, data))
+        return self.match()
+
+    def flush(self):
+        """
+        Function to match the remaining messages at the end of the stream
+
+        :return: List of tuples of reference stamp and list of messages in topic order
+        """
+        samples = self.match(final=True)
+        self.dropped += sum(len(queue) for queue in self.queues.values())
+        for queue in self.queues.values():
+            queue.clear()
+        return samples
+
+    def match(self, final=False):
+        samples = []
+        reference = self.queues[self.topics[0]]
+        while reference:
+            stamp = reference[0][0]
+            indices = []
+            for topic in self.topics[1:]:
+                index = self.find_closest(self.queues[topic], stamp, final)
+                if index is None:
+                    # closest message is not known yet
+                    return samples
+                indices.append(index)
+
+            if -1 in indices:
+                reference.popleft()
+                self.dropped += 1
+                continue
+
+            messages = [reference.popleft()[1]]
+            for topic, index in zip(self.topics[1:], indices):
+                queue = self.queues[topic]
+                # older messages would be even further away from later references
+                for _ in range(index):
+                    queue.popleft()
+                    self.dropped += 1
+                messages.append(queue.popleft()[1])
+            samples.append((stamp, messages))
+            self.matched += 1
+        return samples
+
+    def find_closest(self, queue, stamp, final):
+        """
+        Function to find the message closest to the stamp within the tolerance
+
+        :return: Index of the message, -1 if there is none or None if undecided
+        """
+        while queue and queue[0][0] < stamp - self.tolerance:
+            queue.popleft()
+            self.dropped += 1
+
+        for index, (message_stamp, _) in enumerate(queue):
+            if message_stamp >= stamp:
+                if index > 0 and stamp - queue[index - 1][0] < message_stamp - stamp:
+                    index -= 1
+                return index if abs(queue[index][0] - stamp) <= self.tolerance else -1
+
+        # all buffered messages are older than the stamp, a later one might be closer
+        if not queue:
+            return -1 if final else None
+        return len(queue) - 1 if final else None
+
+
+class PoseInterpolator(object):
+    """
+    Interpolates poses [x, y, z, qx, qy, qz, qw] of a bounded pose history
+
+    Positions are interpolated linearly and orientations spherically. Stamps
+    outside of the history use the closest pose.
+
+    :param history_size: Maximum number of stored poses
+    """
+
+    def __init__(self, history_size=1000):
+        self.stamps = collections.deque(maxlen=history_size)
+        self.poses = collections.deque(maxlen=history_size)
+
+    def add(self, stamp, pose):
+        if self.stamps and stamp <= self.stamps[-1]:
+            return
+        self.stamps.append(stamp)
+        self.poses.append(pose)
+
+    def covers(self, stamp):
+        return bool(self.stamps) and self.stamps[-1] >= stamp
+
+    def interpolate(self, stamp):
+        if not self.stamps:
+            return [np.nan] * 7
+
+        index = bisect.bisect_left(self.stamps, stamp)
+        # poses before the previous one are not needed for later stamps anymore
+        for _ in range(max(index - 1, 0)):
+            self.stamps.popleft()
+            self.poses.popleft()
+        index = min(index, 1)
+
+        if index == 0:
+            return list(self.poses[0])
+        if index == len(self.stamps):
+            return list(self.poses[-1])
+
+        t0, t1 = self.stamps[index - 1], self.stamps[index]
+        p0, p1 = self.poses[index - 1], self.poses[index]
+        t = (stamp - t0) / (t1 - t0)
+        position = [a + t * (b - a) for a, b in zip(p0[:3], p1[:3])]
+        return position + list(slerp(p0[3:], p1[3:], t))
+
+
+def synchronized_samples(reader,
+                         topics,
+                         tf_topic=None,
+                         ego_frame="ego_vehicle",
+                         tolerance=DEFAULT_TOLERANCE,
+                         queue_size=DEFAULT_QUEUE_SIZE):
+    """
+    Generator of time synchronized samples of a bag reader
+
+    Messages are joined by their header stamp without being deserialized. If a
+    transform topic is given, the ego pose is interpolated to the sample stamp.
+    Samples are held back until a later pose is known, but at most queue_size.
+
+    :param reader: rosbag2_py reader, filtered to the topics and transform topic
+    :param topics: List of topics with std_msgs/Header, the first one is the reference topic
+    :param tf_topic: Transform topic or None
+    :param ego_frame: Child frame id of the ego vehicle transforms
+    :param tolerance: Maximum stamp difference in seconds of messages in one sample
+    :param queue_size: Maximum number of buffered messages per topic
+    :return: Tuples of stamp, list of serialized messages in topic order and pose
+    """
+    from rclpy.serialization import deserialize_message
+    from rosidl_runtime_py.utilities import get_message
+
+    synchronizer = SampleSynchronizer(topics, tolerance, queue_size)
+    interpolator = PoseInterpolator()
+    tf_type = get_message(TF_TYPE) if tf_topic else None
+    pending = collections.deque()
+
+    while reader.has_next():
+        topic, data, _ = reader.read_next()
+        if topic == tf_topic:
+            for transform in deserialize_message(data, tf_type).transforms:
+                if transform.child_frame_id == ego_frame:
+                    stamp = transform.header.stamp
+                    t = transform.transform
+                    interpolator.add(stamp.sec + stamp.nanosec * 1e-9, [
+                        t.translation.x, t.translation.y, t.translation.z,
+                        t.rotation.x, t.rotation.y, t.rotation.z, t.rotation.w
+                    ])
+        elif topic in synchronizer.queues:
+            pending.extend(synchronizer.add(topic, read_stamp(data), data))
+
+        while pending and (tf_topic is None or len(pending) > queue_size or
+                           interpolator.covers(pending[0][0])):
+            stamp, messages = pending.popleft()
+            yield stamp, messages, interpolator.interpolate(stamp)
+
+    pending.extend(synchronizer.flush())
+    while pending:
+        stamp, messages = pending.popleft()
+        yield stamp, messages, interpolator.interpolate(stamp)
+
+    print("Synchronized {} samples of {}, dropped {} messages".format(
+        synchronizer.matched, ", ".join(topics), synchronizer.dropped))
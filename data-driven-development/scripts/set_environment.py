@@ -19,6 +19,7 @@ except IndexError:
 # Carla Import
 import carla
 from carla import VehicleLightState as vls
+from map_cache import MapCache, sample_navigation_locations
 
 # System imports
 import argparse
@@ -37,49 +38,52 @@ DEFAULT_PERCENTAGE_PEDESTRIANS_CROSSING = 0.0
 
 
 #########################################################
-##################### Main Function #####################
+#################### Traffic Spawner ####################
 #########################################################
-def main():
-    # Parse arguments
-    args = parseArguments()
-
-    # Parse config file
-    if args.config_file != "":
-        config = parseConfigFile(args.config_file)
-        if config is None:
-            logging.error("Can not parse config file")
-            sys.exit()
-
-        # As we removed any explicitly given arguments from the config, we can merge the config with the arguments without overwriting any intentional arguments
-        args_dict = vars(args).copy()
-        args_dict.update(config)
-        args = argparse.Namespace(**args_dict)
-
-    # Configure logging
-    logging.basicConfig(format="%(levelname)s: %(message)s",
-                        level=logging.INFO)
-
-    # Set up actor lists
-    vehicles_list = []
-    walkers_list = []
-    all_id = []
-
-    # Set up the carla client
-    client = carla.Client(args.host, args.port)
-    client.set_timeout(10.0)
-    synchronous_master = False
-    random.seed(args.seed if args.seed is not None else int(time.time()))
+class TrafficSpawner(object):
+    """
+    Class to spawn background traffic on an existing carla client
 
-    ###########################################
-    # Try to spawn the actors
-    ###########################################
-    try:
-        # Get the world
-        world = client.get_world()
+    :param client: Carla client object
+    :param args: Traffic arguments as namespace (see parseArguments)
+    :param map_cache: Optional MapCache object of the loaded town
+    """
 
-        ###########################################
-        # Set up the weather
-        ###########################################
+    def __init__(self, client, args, map_cache=None):
+        self.client = client
+        self.args = args
+        self.map_cache = map_cache
+        self.world = client.get_world()
+        self.traffic_manager = None
+        self.synchronous_master = False
+        self.saved_weather = None
+
+        # Set up actor lists
+        self.vehicles_list = []
+        self.walkers_list = []
+        self.all_id = []
+        self.all_actors = []
+
+    def spawn(self):
+        """
+        Function to set up the weather and traffic behavior and to spawn all vehicles and walkers
+        """
+        random.seed(self.args.seed if self.args.seed is not None else int(time.time()))
+
+        self.setup_weather()
+        self.setup_traffic_manager()
+        self.spawn_vehicles()
+        self.spawn_walkers()
+
+        print("Spawned %d vehicles and %d walkers." %
+              (len(self.vehicles_list), len(self.walkers_list)))
+
+    def setup_weather(self):
+        """
+        Function to set up the weather (config file only)
+        """
+        args = self.args
+        world = self.world
 
         # Get available weather presets from carla
         weather_presets = {
@@ -93,7 +97,7 @@ def main():
             print("Generating weather...")
 
             # Save current weather conditions
-            saved_weather = world.get_weather()
+            self.saved_weather = world.get_weather()
 
             # Set weather by preset
             if args.use_weather_preset:
@@ -121,12 +125,16 @@ def main():
             # Apply weather
             world.set_weather(selected_weather)
 
-        ###########################################
-        # Set up the traffic behavior
-        ###########################################
+    def setup_traffic_manager(self):
+        """
+        Function to set up the traffic behavior and the world settings
+        """
+        args = self.args
+        world = self.world
 
         # Get the traffic manager
-        traffic_manager = client.get_trafficmanager(args.tm_port)
+        traffic_manager = self.client.get_trafficmanager(args.tm_port)
+        self.traffic_manager = traffic_manager
 
         # All vehicles have to be at least a certain distance apart
         global_distance_to_leading_vehicle = getattr(
@@ -201,11 +209,11 @@ def main():
                 " make sure to start this script with the --asynch argument.")
             traffic_manager.set_synchronous_mode(True)
             if not settings.synchronous_mode:
-                synchronous_master = True
+                self.synchronous_master = True
                 settings.synchronous_mode = True
                 settings.fixed_delta_seconds = 0.025
             else:
-                synchronous_master = False
+                self.synchronous_master = False
         else:
             logging.warning(
                 "You are currently in asynchronous mode. If this is a traffic"
@@ -224,11 +232,17 @@ def main():
         # Apply world settings
         world.apply_settings(settings)
 
-        # Get blueprints for vehicles and walkers TODO: More fine grained control over the blueprints
+    def spawn_vehicles(self):
+        """
+        Function to spawn the vehicles with autopilot
+        """
+        args = self.args
+        world = self.world
+        traffic_manager = self.traffic_manager
+
+        # Get blueprints for vehicles TODO: More fine grained control over the blueprints
         blueprints = get_actor_blueprints(world, args.filterv,
                                           args.generationv)
-        blueprintsWalkers = get_actor_blueprints(world, args.filterw,
-                                                 args.generationw)
 
         # Set safe spawning for vehicles
         if args.safe:
@@ -260,7 +274,10 @@ def main():
                     " was given. Please specify a distribution.")
 
         # Get spawn points for vehicles
-        spawn_points = world.get_map().get_spawn_points()
+        if self.map_cache is not None:
+            spawn_points = self.map_cache.get_spawn_points(world)
+        else:
+            spawn_points = world.get_map().get_spawn_points()
         number_of_spawn_points = len(spawn_points)
 
         if args.number_of_vehicles < number_of_spawn_points:
@@ -275,70 +292,45 @@ def main():
         SetAutopilot = carla.command.SetAutopilot
         FutureActor = carla.command.FutureActor
 
-        ###########################################
-        # Spawn vehicles
-        ###########################################
+        # Spawn only the requested number of vehicles
+        number_of_vehicles = min(args.number_of_vehicles, number_of_spawn_points)
+
+        # If Distribution is requested, get the vehicle type of every vehicle up front
+        blueprint_index = build_blueprint_index(blueprints)
+        if hasattr(args, 'filter_by_type') and hasattr(
+                args, 'vehicle_distribution'
+        ) and args.filter_by_type and args.vehicle_distribution is not None:
+            vehicle_types = []
+            for vehicle_type, count in vehicle_distribution_absolute.items():
+                vehicle_types.extend([vehicle_type] * count)
+            # Remaining vehicles are of the last type
+            last_vehicle_type = list(vehicle_distribution_absolute)[-1]
+            vehicle_types.extend([last_vehicle_type] *
+                                 (number_of_vehicles - len(vehicle_types)))
+            vehicle_types = vehicle_types[:number_of_vehicles]
+
+            if any(not blueprint_index.get(x) for x in set(vehicle_types)):
+                raise ValueError(
+                    "The vehicle distribution is not compatible with the filter."
+                )
+        else:
+            # If no distribution is requested, select all blueprints
+            vehicle_types = [None] * number_of_vehicles
 
         # Set up the batch and hero
         batch = []
         hero = args.hero
 
-        # Iterator for vehicle distribution
-        current_type_id = 0
-        current_type_count = 0
-
         # Iterate over the spawn points and spawn the vehicles
-        for n, transform in enumerate(spawn_points):
-            # Spawn only the requested number of vehicles
-            if n >= args.number_of_vehicles:
-                break
-
-            # If Distribution is requested, get the blueprint from the class
-            if hasattr(args, 'filter_by_type') and hasattr(
-                    args, 'vehicle_distribution'
-            ) and args.filter_by_type and args.vehicle_distribution is not None:
-
-                while current_type_id < len(args.vehicle_distribution):
-                    # Get the current type
-                    current_type = list(
-                        args.vehicle_distribution.keys())[current_type_id]
-
-                    # Check if the current type has been spawned enough
-                    if current_type_count >= vehicle_distribution_absolute[
-                            current_type]:
-                        current_type_id += 1
-                        current_type_count = 0
-                    else:
-                        break  # Found a type that can be spawned
-
-                # Filter Blueprints by Type
-                selected_blueprints = [
-                    x for x in blueprints
-                    if x.get_attribute("object_type") == current_type
-                ]
-
-                if selected_blueprints == []:
-                    raise ValueError(
-                        "The vehicle distribution is not compatible with the filter."
-                    )
-
-                # Increase the current type count
-                current_type_count += 1
-            else:
-                # If no distribution is requested, select all blueprints
-                selected_blueprints = blueprints
-
+        for vehicle_type, transform in zip(vehicle_types, spawn_points):
             # Chose a random blueprint and configure it
-            blueprint = random.choice(selected_blueprints)
-
-            if blueprint.has_attribute("color"):
-                color = random.choice(
-                    blueprint.get_attribute("color").recommended_values)
-                blueprint.set_attribute("color", color)
-            if blueprint.has_attribute("driver_id"):
-                driver_id = random.choice(
-                    blueprint.get_attribute("driver_id").recommended_values)
-                blueprint.set_attribute("driver_id", driver_id)
+            blueprint, colors, driver_ids = blueprint_index[vehicle_type][
+                random.randint(len(blueprint_index[vehicle_type]))]
+
+            if colors:
+                blueprint.set_attribute("color", random.choice(colors))
+            if driver_ids:
+                blueprint.set_attribute("driver_id", random.choice(driver_ids))
             if hero:
                 blueprint.set_attribute(
                     "role_name", "hero"
@@ -354,21 +346,28 @@ def main():
                                  traffic_manager.get_port())))
 
         # Apply the batch
-        for response in client.apply_batch_sync(batch, synchronous_master):
+        for response in self.client.apply_batch_sync(batch, self.synchronous_master):
             if response.error:
                 logging.error(response.error)
             else:
-                vehicles_list.append(response.actor_id)
+                self.vehicles_list.append(response.actor_id)
 
         # Set automatic vehicle lights update if specified
         if args.car_lights_on:
-            all_vehicle_actors = world.get_actors(vehicles_list)
+            all_vehicle_actors = world.get_actors(self.vehicles_list)
             for actor in all_vehicle_actors:
                 traffic_manager.update_vehicle_lights(actor, True)
 
-        ###########################################
-        # Spawn Walkers
-        ###########################################
+    def spawn_walkers(self):
+        """
+        Function to spawn the walkers and start their AI controllers
+        """
+        args = self.args
+        world = self.world
+        SpawnActor = carla.command.SpawnActor
+
+        blueprintsWalkers = get_actor_blueprints(world, args.filterw,
+                                                 args.generationw)
 
         # Specify pedestrian behavior
         percentagePedestriansRunning = getattr(
@@ -390,14 +389,19 @@ def main():
                 " pedestrian config all the time.")
             logging.warning(msg, str(args.seedw))
 
-        # Define spawn points for walkers randomly
+        # Sample spawn points and destinations for all walkers in one pass
+        if self.map_cache is not None:
+            locations, round_trips = self.map_cache.get_navigation_locations(
+                world, 2 * args.number_of_walkers)
+        else:
+            locations, round_trips = sample_navigation_locations(
+                world, 2 * args.number_of_walkers)
+        destinations = locations[args.number_of_walkers:] or locations
         spawn_points = []
-        for i in range(args.number_of_walkers):
+        for loc in locations[:args.number_of_walkers]:
             spawn_point = carla.Transform()
-            loc = world.get_random_location_from_navigation()
-            if loc != None:
-                spawn_point.location = loc
-                spawn_points.append(spawn_point)
+            spawn_point.location = loc
+            spawn_points.append(spawn_point)
 
         # Setup batch and walker speed lists
         batch = []
@@ -425,9 +429,11 @@ def main():
             batch.append(SpawnActor(walker_bp, spawn_point))
 
         # Apply Batch
-        results = client.apply_batch_sync(batch, True)
+        results = self.client.apply_batch_sync(batch, True)
+        round_trips += 1
 
         # Remove walkers, that result in errors
+        walkers_list = self.walkers_list
         walker_speed2 = []
         for i in range(len(results)):
             if results[i].error:
@@ -445,7 +451,8 @@ def main():
             batch.append(
                 SpawnActor(walker_controller_bp, carla.Transform(),
                            walkers_list[i]["id"]))
-        results = client.apply_batch_sync(batch, True)
+        results = self.client.apply_batch_sync(batch, True)
+        round_trips += 1
         for i in range(len(results)):
             if results[i].error:
                 logging.error(results[i].error)
@@ -454,52 +461,56 @@ def main():
 
         # Match walker controllers with walkers
         for i in range(len(walkers_list)):
-            all_id.append(walkers_list[i]["con"])
-            all_id.append(walkers_list[i]["id"])
-        all_actors = world.get_actors(all_id)
+            self.all_id.append(walkers_list[i]["con"])
+            self.all_id.append(walkers_list[i]["id"])
+        self.all_actors = world.get_actors(self.all_id)
+        round_trips += 1
 
         # Wait for a tick to ensure client receives the last transform of the walkers we have just created
-        if args.asynch or not synchronous_master:
-            world.wait_for_tick()
-        else:
-            world.tick()
+        self.tick()
+        round_trips += 1
 
         # Initialize each controller and set target to walk to (list is [controler, actor, controller, actor ...])
         # Set how many pedestrians can cross the road
+        # There are no batch commands for walker controllers, but the destinations are already sampled
         world.set_pedestrians_cross_factor(percentagePedestriansCrossing)
-        for i in range(0, len(all_id), 2):
+        round_trips += 1
+        for i in range(0, len(self.all_id), 2):
             # Start walker
-            all_actors[i].start()
+            self.all_actors[i].start()
             # Set walk to random point
-            all_actors[i].go_to_location(
-                world.get_random_location_from_navigation())
+            self.all_actors[i].go_to_location(
+                destinations[int(i / 2) % len(destinations)])
             # Max speed
-            all_actors[i].set_max_speed(float(walker_speed[int(i / 2)]))
+            self.all_actors[i].set_max_speed(float(walker_speed[int(i / 2)]))
+            round_trips += 3
+
+        logging.info("Set up %d walkers with %d server round trips",
+                     len(walkers_list), round_trips)
+
+    def tick(self):
+        """
+        Function to advance (synchronous master) or wait for the next simulation step
+        """
+        if not self.args.asynch and self.synchronous_master:
+            self.world.tick()
+        else:
+            self.world.wait_for_tick()
 
-        ###########################################
-        # Finish up traffic generation
-        ###########################################
-        print("Spawned %d vehicles and %d walkers, press Ctrl+C to exit." %
-              (len(vehicles_list), len(walkers_list)))
+    def destroy(self):
+        """
+        Function to remove all spawned actors and restore the world settings
+        """
+        args = self.args
+        world = self.world
 
-        # Run until interrupted by the user
-        while True:
-            if not args.asynch and synchronous_master:
-                world.tick()
-            else:
-                world.wait_for_tick()
-
-    ###########################################
-    # Remove all spawned actors before we quit.
-    ###########################################
-    finally:
         # Reset weather conditions
-        if hasattr(args, "generate_weather") and args.generate_weather:
+        if self.saved_weather is not None:
             print("Resetting Weather")
-            world.set_weather(saved_weather)
+            world.set_weather(self.saved_weather)
 
         # Restore synchronous mode if needed.
-        if not args.asynch and synchronous_master:
+        if not args.asynch and self.synchronous_master:
             settings = world.get_settings()
             settings.synchronous_mode = False
             settings.no_rendering_mode = False
@@ -507,28 +518,76 @@ def main():
             world.apply_settings(settings)
 
         # Destroy vehicles
-        print("\ndestroying %d vehicles" % len(vehicles_list))
-        client.apply_batch(
-            [carla.command.DestroyActor(x) for x in vehicles_list])
+        print("\ndestroying %d vehicles" % len(self.vehicles_list))
+        self.client.apply_batch(
+            [carla.command.DestroyActor(x) for x in self.vehicles_list])
 
         # Stop walker controllers (list is [controller, actor, controller, actor ...])
-        for i in range(0, len(all_id), 2):
-            all_actors[i].stop()
+        for i in range(0, len(self.all_actors), 2):
+            self.all_actors[i].stop()
 
         # Destroy walkers
-        print("\ndestroying %d walkers" % len(walkers_list))
-        client.apply_batch([carla.command.DestroyActor(x) for x in all_id])
+        print("\ndestroying %d walkers" % len(self.walkers_list))
+        self.client.apply_batch([carla.command.DestroyActor(x) for x in self.all_id])
 
         time.sleep(0.5)
 
 
+#########################################################
+##################### Main Function #####################
+#########################################################
+def main():
+    # Parse arguments
+    args = parseArguments()
+
+    # Parse config file
+    if args.config_file != "":
+        config = parseConfigFile(args.config_file)
+        if config is None:
+            logging.error("Can not parse config file")
+            sys.exit()
+
+        # As we removed any explicitly given arguments from the config, we can merge the config with the arguments without overwriting any intentional arguments
+        args_dict = vars(args).copy()
+        args_dict.update(config)
+        args = argparse.Namespace(**args_dict)
+
+    # Configure logging
+    logging.basicConfig(format="%(levelname)s: %(message)s",
+                        level=logging.INFO)
+
+    # Set up the carla client
+    client = carla.Client(args.host, args.port)
+    client.set_timeout(10.0)
+
+    ###########################################
+    # Try to spawn the actors
+    ###########################################
+    map_cache = MapCache.from_client(client, args.map_cache_dir, args.town)
+    traffic_spawner = TrafficSpawner(client, args, map_cache)
+    try:
+        traffic_spawner.spawn()
+        print("Press Ctrl+C to exit.")
+
+        # Run until interrupted by the user
+        while True:
+            traffic_spawner.tick()
+
+    ###########################################
+    # Remove all spawned actors before we quit.
+    ###########################################
+    finally:
+        traffic_spawner.destroy()
+
+
 #########################################################
 #################### Helper Functions ###################
 #########################################################
-def parseArguments():
+def parseArguments(argv=None):
     """
     Function to parse the arguments from the user
 
+    :param argv: List of arguments (default: command line arguments)
     :return: parsed arguments as namespace
     """
 
@@ -649,6 +708,18 @@ def parseArguments():
         default=False,
         help="Automatically respawn dormant vehicles (only in large maps)",
     )
+    argparser.add_argument(
+        "--town",
+        metavar="T",
+        default=None,
+        help="Name of the loaded town, required for the map cache",
+    )
+    argparser.add_argument(
+        "--map-cache-dir",
+        metavar="D",
+        default="",
+        help="Existing directory to cache static map data per town (default: no cache)",
+    )
     argparser.add_argument(
         "--no-rendering",
         action="store_true",
@@ -656,7 +727,7 @@ def parseArguments():
         help="Activate no rendering mode",
     )
 
-    return argparser.parse_args()
+    return argparser.parse_args(argv)
 
 
 def parseConfigFile(config_file_path):
@@ -734,6 +805,29 @@ def parseConfigFile(config_file_path):
     return config
 
 
+def build_blueprint_index(blueprints):
+    """
+    Function to index blueprints by object type with their recommended attribute values
+
+    :param blueprints: List of actor blueprints
+    :return: Dict of object type (None for all blueprints) to list of (blueprint, colors, driver ids)
+    """
+    blueprint_index = {None: []}
+    for blueprint in blueprints:
+        colors = blueprint.get_attribute("color").recommended_values if blueprint.has_attribute(
+            "color") else []
+        driver_ids = blueprint.get_attribute("driver_id").recommended_values if blueprint.has_attribute(
+            "driver_id") else []
+        entry = (blueprint, colors, driver_ids)
+
+        blueprint_index[None].append(entry)
+        if blueprint.has_attribute("object_type"):
+            object_type = blueprint.get_attribute("object_type").as_str()
+            blueprint_index.setdefault(object_type, []).append(entry)
+
+    return blueprint_index
+
+
 def get_actor_blueprints(world, filter, generation):
     """
     Function to get actor blueprints
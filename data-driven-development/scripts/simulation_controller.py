@@ -1,5 +1,4 @@
 import sys
-import subprocess
 import random
 import glob
 import os
@@ -10,6 +9,13 @@ import time
 
 import carla
 
+from map_cache import MapCache
+from set_environment import TrafficSpawner, parseArguments
+from world_readiness import wait_for_world
+
+# Filter out twowheeled vehicles which have no boundingbox
+TRAFFIC_VEHICLE_FILTER = 'vehicle.*[!vehicle.bh.crossbike][!vehicle.diamondback.century][!vehicle.harley-davidson.low_rider][!vehicle.gazelle.omafiets][!vehicle.kawasaki.ninja][!vehicle.yamaha.yzf]'
+
 
 def main():
     argparser = argparse.ArgumentParser(description=__doc__)
@@ -48,35 +54,33 @@ def main():
         metavar='W',
         default=None,
         help='')
+    argparser.add_argument(
+        '--map_cache_dir',
+        metavar='D',
+        default='/map-cache',
+        help='Existing directory to cache static map data per town (default: /map-cache)')
 
     args = argparser.parse_args()
 
-    config_list = ["--host", args.host]
     tm_list = ["--host", args.host]
-    if args.weather:
-        config_list.extend(["--weather", args.weather])
     if args.vehicle_number:
         tm_list.extend(["--number-of-vehicles", args.vehicle_number])
     if args.walker_number:
         tm_list.extend(["--number-of-walkers", args.walker_number])
 
-    actor_list = []
+    traffic_spawner = None
     try:
         client = carla.Client(args.host, 2000)
         client.set_timeout(10.0)
 
         # check if right map is used
-        while True:
-            time.sleep(0.02)
-            world = client.get_world()
-            print("Waiting for Town {}...".format(args.town))
-            if world.get_map().name == args.town or world.get_map().name == "Carla/Maps/{}".format(args.town):
-                break
+        print("Waiting for Town {}...".format(args.town))
+        world = wait_for_world(client, args.town)
 
         # --- set weather ---
-        # setup the carla simulation config
-        res = subprocess.call(["python", "util/config.py"] + config_list)
-        print("Setups in config.py done")
+        if args.weather:
+            world.set_weather(getattr(carla.WeatherParameters, args.weather))
+            print("Weather set to {}".format(args.weather))
 
         # --- enable autopilot for main vehicles in sensors.json ---
         # get vehicle info from sensors.json
@@ -86,26 +90,42 @@ def main():
         with open("/sensors.json") as handle:
             json_actors = json.loads(handle.read())
 
-        # save all vehicles in list
-        vehicles = []
+        # save role names of all vehicles in list
+        role_names = []
         for actor in json_actors["objects"]:
             actor_type = actor["type"].split('.')[0]
             if actor_type == "vehicle":
-                vehicles.append(actor)
-
-        # iterate over vehicles and set autopilot true
-        for i, vehicle in enumerate(vehicles):
-            # get spawned vehicle
-            for actor in world.get_actors():
-                if actor.attributes.get('role_name') == vehicle["id"]:
-                    player = actor
-                    break
-            print("{} found - Setting autopilot: True".format(vehicle["id"]))
-            player.set_autopilot(True)
+                role_names.append(actor["id"])
+
+        # index spawned vehicles by role name from a single actor snapshot
+        players = {}
+        for actor in world.get_actors().filter('vehicle.*'):
+            players.setdefault(actor.attributes.get('role_name'), actor)
+        missing_role_names = [
+            role_name for role_name in role_names if role_name not in players]
+        if missing_role_names:
+            print("Vehicles not found: {}".format(", ".join(missing_role_names)))
+            raise RuntimeError(
+                "Could not find vehicles {}".format(", ".join(missing_role_names)))
+
+        # set autopilot true for all vehicles in one batch
+        responses = client.apply_batch_sync(
+            [carla.command.SetAutopilot(players[role_name], True) for role_name in role_names])
+        for role_name, response in zip(role_names, responses):
+            if response.error:
+                print("{} - Setting autopilot failed: {}".format(role_name, response.error))
+            else:
+                print("{} found - Setting autopilot: True".format(role_name))
 
         # --- spawn random traffic ---
-        spawn_points = world.get_map().get_spawn_points()
+        map_cache = MapCache.from_client(client, args.map_cache_dir, args.town)
+        if map_cache is not None:
+            spawn_points = map_cache.get_spawn_points(world)
+        else:
+            spawn_points = world.get_map().get_spawn_points()
         print("Map has {} spawnpoints".format(len(spawn_points)))
+        if map_cache is not None:
+            print("Map topology: {}".format(map_cache.get_topology(world)))
 
         # use vehicle_occupancy if it is set correctly and overwrite vehicle_number from list if it is also set
         if args.vehicle_occupancy:
@@ -119,18 +139,20 @@ def main():
                     tm_list.extend(
                         ["--number-of-vehicles", str(int(len(spawn_points)*vehicle_occupancy))])
 
-        # spawn traffic if it is set (filter out twowheeled vehicle which have no boundingbox)
+        # spawn traffic if it is set, reusing the existing client
         if "--number-of-vehicles" in tm_list or "--number-of-walkers" in tm_list:
-            subprocess.run(["python", "set_environment.py", "--asynch", "--filterv",
-                           'vehicle.*[!vehicle.bh.crossbike][!vehicle.diamondback.century][!vehicle.harley-davidson.low_rider][!vehicle.gazelle.omafiets][!vehicle.kawasaki.ninja][!vehicle.yamaha.yzf]'] + tm_list)
+            traffic_args = parseArguments(
+                ["--asynch", "--filterv", TRAFFIC_VEHICLE_FILTER] + tm_list)
+            traffic_spawner = TrafficSpawner(client, traffic_args, map_cache)
+            traffic_spawner.spawn()
 
         while True:
             world.wait_for_tick()
 
     except:
         print('error destroying actors ...')
-        for actor in actor_list:
-            actor.destroy()
+        if traffic_spawner is not None:
+            traffic_spawner.destroy()
         print('done.')
 
 
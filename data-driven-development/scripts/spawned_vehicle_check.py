@@ -3,6 +3,7 @@ import glob
 import os
 import sys
 import argparse
+import time
 
 try:
     sys.path.append(
@@ -14,6 +15,79 @@ except IndexError:
 
 import carla
 
+from world_readiness import wait_for_world
+
+# Deadline for the server connection within a single health check
+READINESS_TIMEOUT = 5.0
+# Delay before the daemon reconnects after the server became unreachable
+RECONNECT_DELAY = 1.0
+
+
+def set_ready(ready_file, is_ready):
+    if is_ready:
+        # write to a temporary file first as the healthcheck may read at any time
+        tmp_file = ready_file + ".tmp"
+        with open(tmp_file, "w") as file:
+            file.write("ready\n")
+        os.replace(tmp_file, ready_file)
+    elif os.path.exists(ready_file):
+        os.remove(ready_file)
+
+
+def watch_vehicles(client, role_names, ready_file):
+    """
+    Watch the spawned actors of every tick and mark readiness once all vehicles exist
+
+    Only actors which are new in a snapshot are requested from the server, so
+    the vehicles are found within one tick after they are spawned. Readiness is
+    revoked if one of the vehicles is destroyed.
+
+    :param client: Carla client object
+    :param role_names: Role names of the vehicles to wait for
+    :param ready_file: File which exists while all vehicles are spawned
+    """
+    world = wait_for_world(client, timeout=float("inf"))
+    known_ids = set()
+    vehicles = dict()
+    is_ready = False
+
+    while True:
+        snapshot = world.wait_for_tick()
+        actor_ids = set(actor.id for actor in snapshot)
+
+        new_ids = actor_ids - known_ids
+        if new_ids:
+            for actor in world.get_actors(list(new_ids)).filter('vehicle.*'):
+                role_name = actor.attributes.get('role_name')
+                if role_name in role_names:
+                    vehicles[role_name] = actor.id
+                    print("{} is spawned.".format(role_name))
+        known_ids = actor_ids
+
+        for role_name in [x for x, actor_id in vehicles.items() if actor_id not in actor_ids]:
+            print("{} was destroyed.".format(role_name))
+            del vehicles[role_name]
+
+        if is_ready != (len(vehicles) == len(role_names)):
+            is_ready = not is_ready
+            set_ready(ready_file, is_ready)
+            if is_ready:
+                print("All vehicles spawned, ready after frame {}.".format(snapshot.frame))
+
+
+def run_daemon(args, role_names):
+    client = carla.Client(args.host, 2000)
+    client.set_timeout(10.0)
+    set_ready(args.ready_file, False)
+    # never exit on its own, the run would be aborted otherwise
+    while True:
+        try:
+            watch_vehicles(client, set(role_names), args.ready_file)
+        except RuntimeError as e:
+            print("Lost connection to server: {}".format(e))
+            set_ready(args.ready_file, False)
+            time.sleep(RECONNECT_DELAY)
+
 
 def main():
     argparser = argparse.ArgumentParser(description=__doc__)
@@ -28,35 +102,45 @@ def main():
                            help='Name of vehicle to wait')
     argparser.add_argument('--role_name_list',
                            metavar='RL',
+                           nargs='+',
                            default=None,
-                           help='List of vehicle to wait')
+                           help='List of vehicles to wait, separated by spaces or commas')
+    argparser.add_argument('--daemon',
+                           action='store_true',
+                           help='Keep watching the spawned vehicles and signal readiness via the ready file')
+    argparser.add_argument('--ready_file',
+                           metavar='F',
+                           default='/tmp/vehicles-ready',
+                           help='File which exists while all vehicles are spawned (daemon mode only)')
 
     args = argparser.parse_args()
 
     if args.role_name_list:
-        role_names = args.role_name_list.split(",")
+        role_names = [role_name for item in args.role_name_list
+                      for role_name in item.split(",") if role_name]
     else:
         role_names = [args.role_name]
 
+    if args.daemon:
+        return run_daemon(args, role_names)
+
     client = carla.Client(args.host, 2000)
     client.set_timeout(10.0)
-    world = client.get_world()
+    world = wait_for_world(client, timeout=READINESS_TIMEOUT)
 
     world.wait_for_tick()
 
-    is_ego_vehicle_spawned = False
-    for role_name in role_names:
-        actor_list = world.get_actors().filter('vehicle.*')
-        for actor in actor_list:
-            if actor.attributes.get('role_name') == role_name:
-                is_ego_vehicle_spawned = True
-
-        if is_ego_vehicle_spawned:
-            print("{} is spawned.".format(role_name))
-        else:
-            print("Waiting for {} ...".format(role_name))
-            return 1
+    # match all role names against a single actor snapshot
+    spawned_role_names = set(
+        actor.attributes.get('role_name')
+        for actor in world.get_actors().filter('vehicle.*'))
+    missing_role_names = [
+        role_name for role_name in role_names if role_name not in spawned_role_names]
 
+    if missing_role_names:
+        print("Waiting for {} ...".format(", ".join(missing_role_names)))
+        return 1
+    print("{} spawned.".format(", ".join(role_names)))
     return 0
 
 
@@ -0,0 +1,172 @@
+import math
+
+import carla
+
+
+class StopCondition(object):
+    """
+    Base class of a condition which ends a simulation run early
+
+    update is called with every world snapshot from the tick callback and
+    returns the end reason once the condition is met, otherwise None.
+    """
+
+    def update(self, snapshot, simulation_time):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SimulationTimeLimit(StopCondition):
+
+    def __init__(self, max_simulation_time):
+        self.max_simulation_time = max_simulation_time
+
+    def update(self, snapshot, simulation_time):
+        if simulation_time > self.max_simulation_time:
+            return "max_simulation_time"
+        return None
+
+
+class FrameQuota(StopCondition):
+    """
+    Stops once every sensor attached to the ego vehicle has produced enough frames
+
+    Frames are estimated from the simulation time and the sensor_tick of each
+    sensor, so no sensor data has to be streamed to this client. The quota is
+    therefore a simulation time limit and no guarantee about recorded frames.
+    Sensors may be attached after the ego vehicle, so they are looked up until
+    the first one is found.
+    """
+
+    def __init__(self, world, ego_vehicle, min_frames, lookup_interval=1.0):
+        self.world = world
+        self.ego_id = ego_vehicle.id
+        self.min_frames = min_frames
+        self.lookup_interval = lookup_interval
+        self.next_lookup = 0.0
+        self.sensors = dict()
+
+    def find_sensors(self):
+        for actor in self.world.get_actors().filter('sensor.*'):
+            if actor.parent is not None and actor.parent.id == self.ego_id:
+                sensor_tick = float(actor.attributes.get('sensor_tick', 0.0))
+                self.sensors[actor.attributes.get('role_name', actor.type_id)] = [sensor_tick, None, 0]
+
+    def update(self, snapshot, simulation_time):
+        if not self.sensors:
+            # no sensors attached yet, the quota is not reached
+            if simulation_time < self.next_lookup:
+                return None
+            self.next_lookup = simulation_time + self.lookup_interval
+            self.find_sensors()
+            if not self.sensors:
+                return None
+
+        for sensor in self.sensors.values():
+            sensor_tick, next_capture, frames = sensor
+            if next_capture is None or simulation_time >= next_capture:
+                sensor[1] = simulation_time + sensor_tick
+                sensor[2] = frames + 1
+        if min(frames for _, _, frames in self.sensors.values()) >= self.min_frames:
+            return "min_frames"
+        return None
+
+
+class DistanceQuota(StopCondition):
+
+    def __init__(self, ego_vehicle, min_distance):
+        self.ego_id = ego_vehicle.id
+        self.min_distance = min_distance
+        self.distance = 0.0
+        self.last_location = None
+
+    def update(self, snapshot, simulation_time):
+        actor_snapshot = snapshot.find(self.ego_id)
+        if actor_snapshot is None:
+            return None
+        location = actor_snapshot.get_transform().location
+        if self.last_location is not None:
+            self.distance += location.distance(self.last_location)
+        self.last_location = location
+        if self.distance >= self.min_distance:
+            return "min_distance"
+        return None
+
+
+class StationaryTimeout(StopCondition):
+
+    def __init__(self, ego_vehicle, max_stationary_time, speed_threshold=0.1):
+        self.ego_id = ego_vehicle.id
+        self.max_stationary_time = max_stationary_time
+        self.speed_threshold = speed_threshold
+        self.stationary_since = None
+
+    def update(self, snapshot, simulation_time):
+        actor_snapshot = snapshot.find(self.ego_id)
+        if actor_snapshot is None:
+            return None
+        velocity = actor_snapshot.get_velocity()
+        speed = math.sqrt(velocity.x**2 + velocity.y**2 + velocity.z**2)
+        if speed > self.speed_threshold:
+            self.stationary_since = None
+        elif self.stationary_since is None:
+            self.stationary_since = simulation_time
+        elif simulation_time - self.stationary_since >= self.max_stationary_time:
+            return "stationary"
+        return None
+
+
+class CollisionStop(StopCondition):
+
+    def __init__(self, world, ego_vehicle):
+        self.collided_with = None
+        blueprint = world.get_blueprint_library().find('sensor.other.collision')
+        self.sensor = world.spawn_actor(blueprint, carla.Transform(), attach_to=ego_vehicle)
+        self.sensor.listen(self.on_collision)
+
+    def on_collision(self, event):
+        if self.collided_with is None:
+            self.collided_with = event.other_actor.type_id
+
+    def update(self, snapshot, simulation_time):
+        if self.collided_with is not None:
+            return "collision"
+        return None
+
+    def close(self):
+        self.sensor.stop()
+        self.sensor.destroy()
+
+
+def find_ego_vehicle(world, role_name):
+    for actor in world.get_actors().filter('vehicle.*'):
+        if actor.attributes.get('role_name') == role_name:
+            return actor
+    raise RuntimeError("Could not find ego vehicle {}".format(role_name))
+
+
+def create_stop_conditions(world, args):
+    """
+    Function to create all stop conditions enabled by the command line arguments
+
+    :param world: Carla world object
+    :param args: Parsed arguments of the time controller
+    :return: List of stop conditions
+    """
+    conditions = [SimulationTimeLimit(float(args.max_simulation_time))]
+    if not (args.min_frames or args.min_distance or args.max_stationary_time or
+            args.stop_on_collision):
+        return conditions
+
+    ego_vehicle = find_ego_vehicle(world, args.ego_role_name)
+    if args.min_frames:
+        conditions.append(FrameQuota(world, ego_vehicle, args.min_frames))
+    if args.min_distance:
+        conditions.append(DistanceQuota(ego_vehicle, args.min_distance))
+    if args.max_stationary_time:
+        conditions.append(StationaryTimeout(ego_vehicle, args.max_stationary_time))
+    if args.stop_on_collision:
+        conditions.append(CollisionStop(world, ego_vehicle))
+    return conditions
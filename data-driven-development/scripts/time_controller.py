@@ -5,10 +5,64 @@ import glob
 import os
 import sys
 import argparse
+import json
+import threading
 import time
 
 import carla
 
+from stop_conditions import create_stop_conditions
+from world_readiness import wait_for_world
+
+# Maximum time to wait for a tick callback before the simulation time is polled
+POLL_INTERVAL = 1.0
+
+
+class SimulationClock(object):
+    """Tracks the simulation time of the world and evaluates the stop conditions through tick callbacks."""
+
+    def __init__(self, world, start_snapshot, stop_conditions):
+        self.world = world
+        self.start_elapsed_seconds = start_snapshot.timestamp.elapsed_seconds
+        self.elapsed_seconds = self.start_elapsed_seconds
+        self.stop_conditions = stop_conditions
+        self.end_reason = None
+        self.last_update = time.time()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.callback_id = world.on_tick(self.update)
+
+    def update(self, snapshot):
+        # callbacks and polls may overlap, conditions are not thread-safe
+        with self.lock:
+            if self.stopped.is_set():
+                return
+            self.elapsed_seconds = snapshot.timestamp.elapsed_seconds
+            self.last_update = time.time()
+            for condition in self.stop_conditions:
+                reason = condition.update(snapshot, self.simulation_time())
+                if reason is not None:
+                    self.end_reason = reason
+                    self.stopped.set()
+                    return
+
+    def poll(self):
+        # fallback if tick callbacks are not delivered
+        self.update(self.world.get_snapshot())
+
+    def simulation_time(self):
+        return self.elapsed_seconds - self.start_elapsed_seconds
+
+    def close(self):
+        self.world.remove_on_tick(self.callback_id)
+        for condition in self.stop_conditions:
+            condition.close()
+
+
+def write_report(report_file, report):
+    with open(report_file, "w") as file:
+        json.dump(report, file, indent=2)
+
 
 def main():
 
@@ -27,33 +81,86 @@ def main():
                            metavar='R',
                            default='300',
                            help='Maximal real time before server is closed')
+    argparser.add_argument('--town',
+                           metavar='T',
+                           default=None,
+                           help='Town which has to be loaded before the simulation time is measured')
+    argparser.add_argument('--ego_role_name',
+                           metavar='R',
+                           default='ego_vehicle',
+                           help='Role name of the ego vehicle used by the stop conditions (default: ego_vehicle)')
+    argparser.add_argument('--min_frames',
+                           metavar='N',
+                           default=None,
+                           type=int,
+                           help='Stop once every sensor of the ego vehicle should have produced N frames. '
+                           'Frames are estimated from the simulation time and the sensor_tick of the '
+                           'sensors, so this is a simulation time limit and no guarantee about recorded frames')
+    argparser.add_argument('--min_distance',
+                           metavar='D',
+                           default=None,
+                           type=float,
+                           help='Stop once the ego vehicle has driven D meters')
+    argparser.add_argument('--max_stationary_time',
+                           metavar='S',
+                           default=None,
+                           type=float,
+                           help='Stop once the ego vehicle has not moved for S seconds simulation time')
+    argparser.add_argument('--stop_on_collision',
+                           action='store_true',
+                           help='Stop once the ego vehicle collides')
+    argparser.add_argument('--report_file',
+                           metavar='F',
+                           default=None,
+                           help='Json file to store the end reason of the run')
 
     args = argparser.parse_args()
 
     start_time = time.time()
+    max_real_time = float(args.max_real_time)
 
     # connect to server
     client = carla.Client(args.host, 2000)
     client.set_timeout(10.0)
-    world = client.get_world()
+    world = wait_for_world(client, args.town, timeout=max_real_time)
+    world_wait_time = time.time() - start_time
 
-    world.wait_for_tick()
-    delta_elapsed_seconds = world.get_snapshot().timestamp.elapsed_seconds
+    clock = SimulationClock(world, world.wait_for_tick(),
+                            create_stop_conditions(world, args))
+    clock_start_time = time.time()
 
-    while world.get_snapshot(
-    ).timestamp.elapsed_seconds - delta_elapsed_seconds <= float(
-            args.max_simulation_time) and time.time() - start_time <= float(
-                args.max_real_time):
-        pass
+    # sleep until a stop condition is met or the real time budget runs out
+    while not clock.stopped.is_set():
+        remaining_real_time = start_time + max_real_time - time.time()
+        if remaining_real_time < 0:
+            break
+        if not clock.stopped.wait(min(remaining_real_time, POLL_INTERVAL)):
+            if time.time() - clock.last_update >= POLL_INTERVAL:
+                clock.poll()
+    clock.close()
 
-    if not world.get_snapshot(
-    ).timestamp.elapsed_seconds - delta_elapsed_seconds <= float(
-            args.max_simulation_time):
+    end_reason = clock.end_reason or "max_real_time"
+    if end_reason == "max_simulation_time":
         print("Maximum simulation time of {} reached. Stopping the run...".
               format(args.max_simulation_time))
-    if not time.time() - start_time <= float(args.max_real_time):
+    elif end_reason == "max_real_time":
         print("Maximum real time of {} reached. Stopping the run...".format(
             args.max_real_time))
+    else:
+        print("Stop condition {} met. Stopping the run...".format(end_reason))
+
+    real_time = time.time() - clock_start_time
+    print("Simulated {:.1f}s in {:.1f}s real time (sim/real ratio: {:.2f})".format(
+        clock.simulation_time(), real_time,
+        clock.simulation_time() / real_time if real_time > 0 else 0.0))
+
+    if args.report_file:
+        write_report(args.report_file, {
+            "end_reason": end_reason,
+            "simulation_time": clock.simulation_time(),
+            "real_time": real_time,
+            "world_wait_time": world_wait_time,
+        })
 
     return 1
 
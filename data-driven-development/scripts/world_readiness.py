@@ -0,0 +1,61 @@
+import time
+
+# Default limits when waiting for the CARLA server to become ready
+DEFAULT_TIMEOUT = 300.0
+DEFAULT_INITIAL_DELAY = 0.05
+DEFAULT_MAX_DELAY = 2.0
+
+
+def is_town(map_name, town):
+    return map_name == town or map_name == "Carla/Maps/{}".format(town)
+
+
+def wait_for_world(client,
+                   town=None,
+                   timeout=DEFAULT_TIMEOUT,
+                   initial_delay=DEFAULT_INITIAL_DELAY,
+                   max_delay=DEFAULT_MAX_DELAY):
+    """
+    Wait until the server answers and, if given, the town is loaded
+
+    The expensive map name is only requested once per episode, as the cheap
+    world id changes whenever a new map is loaded.
+
+    :param client: Carla client object
+    :param town: Name of the town which has to be loaded
+    :param timeout: Overall deadline in seconds
+    :param initial_delay: First delay between two polls in seconds, doubled after every poll
+    :param max_delay: Maximum delay between two polls in seconds
+    :return: Carla world object
+    """
+    start_time = time.time()
+    delay = initial_delay
+    checked_world_id = None
+    polls = 0
+    map_requests = 0
+
+    while True:
+        polls += 1
+        try:
+            world = client.get_world()
+            if town is None:
+                break
+            if world.id != checked_world_id:
+                checked_world_id = world.id
+                map_requests += 1
+                if is_town(world.get_map().name, town):
+                    break
+        except RuntimeError:
+            # server is not reachable while it is starting or loading a map
+            pass
+
+        if time.time() - start_time + delay > timeout:
+            raise RuntimeError("World {}not ready after {:.1f}s".format(
+                "with town {} ".format(town) if town else "", timeout))
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+    print("World {}ready after {:.2f}s ({} polls, {} map requests)".format(
+        "with town {} ".format(town) if town else "",
+        time.time() - start_time, polls, map_requests))
+    return world
@@ -0,0 +1,105 @@
+import itertools
+import math
+import random
+from typing import Any, Iterator
+
+SAMPLING_STRATEGIES = ("full", "random", "latin_hypercube", "pairwise")
+
+
+def full_factorial(parameters: dict[str, list[Any]]) -> Iterator[dict[str, Any]]:
+    keys, values = zip(*parameters.items())
+    for combination in itertools.product(*values):
+        yield dict(zip(keys, combination))
+
+
+def random_sampling(parameters: dict[str, list[Any]],
+                    num_samples: int,
+                    seed: int = None) -> Iterator[dict[str, Any]]:
+    # Draw distinct indices of the full factorial space without enumerating it
+    keys, values = zip(*parameters.items())
+    num_combinations = math.prod(len(v) for v in values)
+    rng = random.Random(seed)
+    for index in rng.sample(range(num_combinations), min(num_samples, num_combinations)):
+        combination = {}
+        for key, key_values in zip(reversed(keys), reversed(values)):
+            index, value_index = divmod(index, len(key_values))
+            combination[key] = key_values[value_index]
+        yield {key: combination[key] for key in keys}
+
+
+def latin_hypercube(parameters: dict[str, list[Any]],
+                    num_samples: int,
+                    seed: int = None) -> Iterator[dict[str, Any]]:
+    # Every value of a parameter is used equally often, values are paired randomly
+    rng = random.Random(seed)
+    columns = {}
+    for key, key_values in parameters.items():
+        column = [i * len(key_values) // num_samples for i in range(num_samples)]
+        rng.shuffle(column)
+        columns[key] = column
+    for sample in range(num_samples):
+        yield {key: parameters[key][columns[key][sample]] for key in parameters}
+
+
+def covering_array(parameters: dict[str, list[Any]],
+                   strength: int = 2,
+                   seed: int = None) -> Iterator[dict[str, Any]]:
+    """Greedily yields setups until every value combination of `strength` parameters is covered."""
+    keys = list(parameters)
+    sizes = [len(parameters[key]) for key in keys]
+    strength = min(strength, len(keys))
+    rng = random.Random(seed)
+
+    uncovered = set()
+    for indices in itertools.combinations(range(len(keys)), strength):
+        for value_indices in itertools.product(*(range(sizes[i]) for i in indices)):
+            uncovered.add(tuple(zip(indices, value_indices)))
+
+    def covered_by(row: dict[int, int], parameter: int) -> set[tuple]:
+        # All combinations which contain the parameter and only assigned parameters
+        others = [i for i in row if i != parameter]
+        tuples = set()
+        for indices in itertools.combinations(others, strength - 1):
+            indices = tuple(sorted(indices + (parameter,)))
+            tuples.add(tuple((i, row[i]) for i in indices))
+        return tuples
+
+    while uncovered:
+        # Start from an uncovered combination and complete it parameter by parameter
+        row = dict(min(uncovered))
+        free_parameters = [i for i in range(len(keys)) if i not in row]
+        rng.shuffle(free_parameters)
+        for parameter in free_parameters:
+            candidates = list(range(sizes[parameter]))
+            rng.shuffle(candidates)
+            row[parameter] = max(candidates, key=lambda value: len(
+                covered_by({**row, parameter: value}, parameter) & uncovered))
+        uncovered -= {tuple((i, row[i]) for i in indices)
+                      for indices in itertools.combinations(range(len(keys)), strength)}
+        yield {key: parameters[key][row[i]] for i, key in enumerate(keys)}
+
+
+def generate_setups(parameters: dict[str, list[Any]],
+                    sampling: dict[str, Any] = None) -> Iterator[dict[str, Any]]:
+    """Lazily generates simulation setups from parameter value lists with the configured strategy."""
+    sampling = sampling or {}
+    strategy = sampling.get("strategy", "full")
+    num_samples = sampling.get("num_samples")
+    seed = sampling.get("seed")
+
+    if strategy == "full":
+        setups = full_factorial(parameters)
+    elif strategy == "random":
+        setups = random_sampling(parameters, int(num_samples), seed)
+    elif strategy == "latin_hypercube":
+        setups = latin_hypercube(parameters, int(num_samples), seed)
+    elif strategy == "pairwise":
+        setups = covering_array(parameters, int(sampling.get("strength", 2)), seed)
+    else:
+        raise ValueError(f"Unknown sampling strategy {strategy}, "
+                         f"expected one of {', '.join(SAMPLING_STRATEGIES)}")
+
+    # The budget also limits the covering array and the full factorial design
+    if num_samples is not None:
+        setups = itertools.islice(setups, int(num_samples))
+    return setups
@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# The host scripts and the container scripts are plain modules without a package
+DATA_DRIVEN_DEVELOPMENT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(DATA_DRIVEN_DEVELOPMENT), str(DATA_DRIVEN_DEVELOPMENT / "scripts")]
@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from convert_bag import CITYSCAPES_PALETTE, colors_to_labels, image_to_array
+
+
+def make_image(pixels, encoding):
+    pixels = np.asarray(pixels, dtype=np.uint8)
+    return SimpleNamespace(height=pixels.shape[0], width=pixels.shape[1],
+                           encoding=encoding, data=pixels.tobytes())
+
+
+def test_palette_matches_carla_semantic_tags():
+    assert len(CITYSCAPES_PALETTE) == 29
+    assert len(set(CITYSCAPES_PALETTE)) == 29
+    assert CITYSCAPES_PALETTE[1] == (128, 64, 128)
+    assert CITYSCAPES_PALETTE[14] == (0, 0, 142)
+
+
+def test_colors_are_converted_to_semantic_tags():
+    image = np.array([[
+        (128, 64, 128),   # road
+        (0, 0, 142),      # car
+        (190, 153, 153),  # fence
+        (152, 251, 152),  # terrain
+        (255, 0, 0),      # rider
+        (119, 11, 32),    # bicycle
+        (180, 165, 180),  # guard rail
+        (1, 2, 3),        # unknown
+    ]], dtype=np.uint8)
+    assert colors_to_labels(image).tolist() == [[1, 14, 5, 10, 13, 19, 28, 0]]
+
+
+def test_image_to_array_drops_alpha_and_converts_bgr():
+    # CARLA cameras publish bgra8 images
+    image = make_image([[(10, 20, 30, 255), (40, 50, 60, 255)]], "bgra8")
+    array = image_to_array(image)
+    assert array.shape == (1, 2, 3)
+    assert array.tolist() == [[[30, 20, 10], [60, 50, 40]]]
+    assert array.flags["C_CONTIGUOUS"]
+
+    image = make_image([[(10, 20, 30)]], "rgb8")
+    assert image_to_array(image).tolist() == [[[10, 20, 30]]]
+
+
+def test_segmentation_image_round_trip():
+    labels = np.arange(len(CITYSCAPES_PALETTE), dtype=np.uint8).reshape(1, -1)
+    bgra = [[(b, g, r, 255) for r, g, b in CITYSCAPES_PALETTE]]
+    assert (colors_to_labels(image_to_array(make_image(bgra, "bgra8"))) == labels).all()
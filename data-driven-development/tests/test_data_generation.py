@@ -0,0 +1,42 @@
+import pytest
+
+pytest.importorskip("python_on_whales")
+
+import data_generation
+
+
+def test_schedule_setups_groups_towns_across_other_parameters():
+    simulation_setups = [{"sensors_file": sensors_file, "town": town}
+                         for sensors_file in ("a.json", "b.json")
+                         for town in ("Town01", "Town10HD")]
+    simulation_runs = [(execution, simulation_setup)
+                       for execution in range(2)
+                       for simulation_setup in simulation_setups]
+
+    scheduled_runs = data_generation.schedule_setups(simulation_runs)
+
+    assert data_generation.count_map_switches(simulation_runs) == 7
+    assert data_generation.count_map_switches(scheduled_runs) == 1
+    assert [(run[1]["town"], run[1]["sensors_file"], run[0]) for run in scheduled_runs] == [
+        ("Town01", "a.json", 0), ("Town01", "a.json", 1),
+        ("Town01", "b.json", 0), ("Town01", "b.json", 1),
+        ("Town10HD", "a.json", 0), ("Town10HD", "a.json", 1),
+        ("Town10HD", "b.json", 0), ("Town10HD", "b.json", 1),
+    ]
+
+
+def test_setup_hash_covers_the_general_settings():
+    simulation_setup = {"town": "Town01", "sensors_file": "a.json"}
+    general_settings = {"output_path": "./data/", "max_simulation_time": "--max_simulation_time 60",
+                        "stop_conditions": "", "record_topics": "/tf"}
+    setup_hash = data_generation.get_setup_hash(simulation_setup, 0, general_settings, ["carla-server"])
+
+    assert setup_hash == data_generation.get_setup_hash(
+        simulation_setup, 0, {**general_settings, "output_path": "./other/"}, ["carla-server"])
+    for changed_settings in ({"max_simulation_time": "--max_simulation_time 120"},
+                             {"stop_conditions": "--min_distance 100"},
+                             {"record_topics": "/tf /camera"}):
+        assert setup_hash != data_generation.get_setup_hash(
+            simulation_setup, 0, {**general_settings, **changed_settings}, ["carla-server"])
+    assert setup_hash != data_generation.get_setup_hash(simulation_setup, 1, general_settings,
+                                                        ["carla-server"])
@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from frame_store import FrameStore, FrameStoreWriter, chunk_path
+
+
+def write_store(path, num_frames, chunk_size):
+    with FrameStoreWriter(str(path), chunk_size=chunk_size, metadata={"town": "Town01"}) as writer:
+        for index in range(num_frames):
+            writer.append(0.05 * index, {
+                "camera": np.full((2, 3, 3), index, dtype=np.uint8),
+                "lidar": np.full((4, 4), index, dtype=np.float32),
+            }, pose=[index, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0])
+
+
+def test_frames_are_stored_in_memory_mapped_chunks(tmp_path):
+    write_store(tmp_path, num_frames=7, chunk_size=3)
+
+    camera_chunks = sorted(os.listdir(tmp_path / "camera"))
+    assert camera_chunks == ["chunk-00000.npy", "chunk-00001.npy", "chunk-00002.npy"]
+    # chunks have a fixed shape, the last one is only filled partially
+    chunk = np.load(chunk_path(str(tmp_path), "camera", 2), mmap_mode="r")
+    assert isinstance(chunk, np.memmap)
+    assert chunk.shape == (3, 2, 3, 3)
+    assert chunk.dtype == np.uint8
+    assert chunk[0, 0, 0, 0] == 6
+
+
+def test_reader_returns_frames_by_index_and_simulation_time(tmp_path):
+    write_store(tmp_path, num_frames=7, chunk_size=3)
+    store = FrameStore(str(tmp_path))
+
+    assert len(store) == 7
+    assert store.metadata == {"town": "Town01"}
+    assert store.sensors["lidar"] == {"shape": [4, 4], "dtype": "<f4"}
+    frame = store[4]
+    assert frame["timestamp"] == pytest.approx(0.2)
+    assert frame["pose"][0] == 4
+    assert (frame["camera"] == 4).all()
+    assert (store.get("lidar", -1) == 6).all()
+    assert store.find(0.16) == 3
+    assert store.find(10.0) == 6
+    with pytest.raises(IndexError):
+        store[7]
+
+
+def test_frames_with_changing_layout_are_rejected(tmp_path):
+    writer = FrameStoreWriter(str(tmp_path), chunk_size=2)
+    writer.append(0.0, {"camera": np.zeros((2, 2), dtype=np.uint8)})
+    with pytest.raises(ValueError):
+        writer.append(0.1, {"camera": np.zeros((3, 2), dtype=np.uint8)})
+
+
+def test_store_without_sidecar_is_incomplete(tmp_path):
+    writer = FrameStoreWriter(str(tmp_path), chunk_size=2)
+    writer.append(0.0, {"camera": np.zeros((2, 2), dtype=np.uint8)})
+    with pytest.raises(RuntimeError):
+        FrameStore(str(tmp_path))
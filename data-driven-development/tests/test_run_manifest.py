@@ -0,0 +1,95 @@
+import sqlite3
+
+import pytest
+import yaml
+
+from run_manifest import MANIFEST_FILE, RunManifest
+
+
+def write_bag(output_path, name, message_count=10):
+    bag_path = output_path / "bags" / name
+    bag_path.mkdir(parents=True)
+    (bag_path / "data.mcap").write_bytes(b"0" * 100)
+    with (bag_path / "metadata.yaml").open("w") as file:
+        yaml.safe_dump({"rosbag2_bagfile_information": {
+            "message_count": message_count,
+            "topics_with_message_count": [{
+                "topic_metadata": {"name": "/camera", "type": "sensor_msgs/msg/Image"},
+                "message_count": message_count,
+            }],
+        }}, file)
+    return bag_path
+
+
+def make_result(run_name, town, status="completed", duration=10.0):
+    return {"run_name": run_name, "setup_hash": f"hash-{run_name}", "execution": 0,
+            "status": status, "end_reason": "max_simulation_time", "started_at": 1.0,
+            "duration": duration, "setup": {"town": town, "weather": 'cloudy "noon"'},
+            "images": {}, "timings": {"simulation": duration}}
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    write_bag(tmp_path, "run_a_2024-01-01-12-00")
+    write_bag(tmp_path, "run_a_1_2024-01-01-12-05", message_count=99)
+    manifest = RunManifest.for_output_path(str(tmp_path))
+    manifest.register(make_result("run_a", "Town01"), str(tmp_path))
+    manifest.register(make_result("run_b", "Town01", "failed", 20.0), str(tmp_path))
+    manifest.register(make_result("run_c", "Town10HD"), str(tmp_path))
+    yield manifest
+    manifest.close()
+
+
+def test_registered_runs_round_trip(manifest, tmp_path):
+    runs = {run["run_name"]: run for run in manifest.query()}
+
+    assert set(runs) == {"run_a", "run_b", "run_c"}
+    run = runs["run_a"]
+    assert run["setup"] == {"town": "Town01", "weather": 'cloudy "noon"'}
+    assert run["timings"] == {"simulation": 10.0}
+    # the bag of run_a_1 is not mistaken for a bag of run_a
+    assert run["bag_path"] == str(tmp_path / "bags" / "run_a_2024-01-01-12-00")
+    assert run["message_count"] == 10
+    assert run["topics"] == {"/camera": {"type": "sensor_msgs/msg/Image", "message_count": 10}}
+    assert runs["run_b"]["bag_path"] is None
+    assert [run["run_name"] for run in manifest.query("completed", {"town": "Town01"})] == ["run_a"]
+    assert manifest.get_completed_hashes() == {"hash-run_a"}
+
+
+def test_bag_paths_do_not_depend_on_the_working_directory(manifest, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path.parent)
+    other = RunManifest(tmp_path.name + "/" + MANIFEST_FILE)
+    assert other.get_completed_hashes() == {"hash-run_a"}
+    other.close()
+
+
+def test_aggregate_per_parameter_value(manifest):
+    entries = manifest.aggregate("town")
+    assert [(entry["town"], entry["runs"], entry["completed"]) for entry in entries] == [
+        ("Town01", 2, 1), ("Town10HD", 1, 1)]
+    assert entries[0]["avg_duration"] == pytest.approx(15.0)
+
+    # parameter names are quoted as SQL identifiers
+    entries = manifest.aggregate('weather')
+    assert entries[0]["weather"] == 'cloudy "noon"'
+    assert manifest.aggregate('we"ird') == []
+
+
+def test_manifest_of_the_first_schema_version_is_migrated(tmp_path):
+    connection = sqlite3.connect(tmp_path / MANIFEST_FILE)
+    connection.execute("CREATE TABLE runs (run_name TEXT PRIMARY KEY, execution INTEGER, "
+                       "status TEXT, started_at REAL, duration REAL, setup TEXT, images TEXT, "
+                       "timings TEXT, bag_path TEXT, bag_size INTEGER, message_count INTEGER, "
+                       "topics TEXT)")
+    connection.execute("INSERT INTO runs (run_name, status, setup) VALUES ('old', 'completed', '{}')")
+    connection.commit()
+    connection.close()
+
+    manifest = RunManifest.for_output_path(str(tmp_path))
+    manifest.register(make_result("new", "Town01"), str(tmp_path))
+    runs = {run["run_name"]: run for run in manifest.query()}
+    manifest.close()
+
+    assert runs["old"]["setup_hash"] is None
+    assert runs["new"]["setup_hash"] == "hash-new"
+    assert runs["new"]["end_reason"] == "max_simulation_time"
@@ -0,0 +1,59 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from sample_sync import PoseInterpolator, SampleSynchronizer, read_stamp, slerp
+
+
+def test_synchronizer_matches_closest_messages_within_tolerance():
+    synchronizer = SampleSynchronizer(["camera", "lidar"], tolerance=0.01)
+    samples = []
+    for topic, stamp in [("camera", 0.0), ("lidar", 0.004), ("camera", 0.1),
+                         ("lidar", 0.098), ("lidar", 0.103), ("camera", 0.2),
+                         ("lidar", 0.25)]:
+        samples += synchronizer.add(topic, stamp, "{}@{}".format(topic, stamp))
+    samples += synchronizer.flush()
+
+    # the camera frame at 0.2 has no lidar scan within the tolerance
+    assert samples == [
+        (0.0, ["camera@0.0", "lidar@0.004"]),
+        (0.1, ["camera@0.1", "lidar@0.098"]),
+    ]
+    assert synchronizer.matched == 2
+
+
+def test_synchronizer_waits_until_the_closest_message_is_known():
+    synchronizer = SampleSynchronizer(["camera", "lidar"], tolerance=0.05)
+    assert synchronizer.add("camera", 1.0, "camera") == []
+    # a later scan might still be closer to the reference
+    assert synchronizer.add("lidar", 0.98, "early") == []
+    assert synchronizer.add("lidar", 1.01, "close") == [(1.0, ["camera", "close"])]
+
+
+def test_read_stamp_of_little_endian_cdr_header():
+    data = bytes([0, 1, 0, 0]) + (12).to_bytes(4, "little") + (500000000).to_bytes(4, "little")
+    assert read_stamp(data) == pytest.approx(12.5)
+
+
+def test_slerp_interpolates_rotation_angle():
+    identity = [0.0, 0.0, 0.0, 1.0]
+    yaw_90 = [0.0, 0.0, np.sin(np.pi / 4), np.cos(np.pi / 4)]
+    q = slerp(identity, yaw_90, 0.5)
+    assert np.linalg.norm(q) == pytest.approx(1.0)
+    np.testing.assert_allclose(q, [0.0, 0.0, np.sin(np.pi / 8), np.cos(np.pi / 8)])
+    # q and -q are the same rotation, the shorter path is taken
+    np.testing.assert_allclose(slerp(identity, -np.asarray(yaw_90), 0.5), q)
+
+
+def test_pose_interpolator_interpolates_between_poses():
+    interpolator = PoseInterpolator()
+    interpolator.add(0.0, [0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0])
+    interpolator.add(1.0, [2.0, 4.0, 0.0, 0.0, 0.0, 1.0, 0.0])
+
+    assert interpolator.covers(0.5)
+    assert not interpolator.covers(1.5)
+    pose = interpolator.interpolate(0.5)
+    np.testing.assert_allclose(pose[:3], [1.0, 2.0, 0.0])
+    np.testing.assert_allclose(pose[3:], [0.0, 0.0, np.sqrt(0.5), np.sqrt(0.5)])
+    # stamps outside of the history use the closest pose
+    assert interpolator.interpolate(2.0) == [2.0, 4.0, 0.0, 0.0, 0.0, 1.0, 0.0]
@@ -0,0 +1,48 @@
+import itertools
+from collections import Counter
+
+import pytest
+
+from setup_sampling import covering_array, generate_setups, latin_hypercube, random_sampling
+
+PARAMETERS = {
+    "town": ["Town01", "Town02", "Town03"],
+    "weather": ["ClearNoon", "WetNoon", "HardRainNoon"],
+    "vehicles": [0, 10, 50],
+    "sensors_file": ["a.json", "b.json"],
+}
+
+
+def test_covering_array_covers_every_value_pair():
+    setups = list(covering_array(PARAMETERS, strength=2, seed=0))
+
+    for first, second in itertools.combinations(PARAMETERS, 2):
+        covered = {(setup[first], setup[second]) for setup in setups}
+        assert covered == set(itertools.product(PARAMETERS[first], PARAMETERS[second]))
+    # far fewer than the 54 setups of the full factorial design
+    assert len(setups) < 15
+
+
+def test_latin_hypercube_uses_every_value_equally_often():
+    setups = list(latin_hypercube(PARAMETERS, num_samples=6, seed=1))
+
+    assert len(setups) == 6
+    for key, values in PARAMETERS.items():
+        counts = Counter(setup[key] for setup in setups)
+        assert set(counts) == set(values)
+        assert set(counts.values()) == {6 // len(values)}
+
+
+def test_random_sampling_draws_distinct_setups():
+    setups = list(random_sampling(PARAMETERS, num_samples=20, seed=2))
+
+    assert len({tuple(setup.values()) for setup in setups}) == 20
+    assert setups == list(random_sampling(PARAMETERS, num_samples=20, seed=2))
+
+
+def test_generate_setups_limits_the_budget():
+    assert len(list(generate_setups(PARAMETERS))) == 54
+    assert len(list(generate_setups(PARAMETERS, {"num_samples": 5}))) == 5
+    assert len(list(generate_setups(PARAMETERS, {"strategy": "pairwise", "num_samples": 3}))) == 3
+    with pytest.raises(ValueError):
+        generate_setups(PARAMETERS, {"strategy": "sobol"})